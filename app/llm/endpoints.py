@@ -1,27 +1,35 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
+from functools import lru_cache
 from typing import Literal
 
 from .url import has_v1beta, has_v1beta_openai, join_url
 
 LLMMode = Literal["openai", "gemini_native", "gemini_openai"]
 
+# base_url/model 在 provider 生命周期内不可变，lru_cache 让热路径退化为一次 dict 查找，
+# 避免每次 LLM 调用都重跑 has_v1beta* 路径段扫描与 join_url 拼接。
 
+
+@lru_cache(maxsize=64)
 def build_openai_models_url(base_url: str) -> str:
     return join_url(base_url, "models")
 
 
+@lru_cache(maxsize=64)
 def build_openai_chat_completions_url(base_url: str) -> str:
     return join_url(base_url, "chat/completions")
 
 
+@lru_cache(maxsize=64)
 def build_gemini_native_models_url(root: str) -> str:
     if has_v1beta_openai(root):
         raise ValueError("gemini_native 模式下 base_url 不应包含 /v1beta/openai")
     return join_url(root, "models") if has_v1beta(root) else join_url(root, "v1beta/models")
 
 
+@lru_cache(maxsize=64)
 def build_gemini_native_generate_content_url(root: str, model: str) -> str:
     if has_v1beta_openai(root):
         raise ValueError("gemini_native 模式下 base_url 不应包含 /v1beta/openai")
@@ -32,6 +40,7 @@ def build_gemini_native_generate_content_url(root: str, model: str) -> str:
     )
 
 
+@lru_cache(maxsize=64)
 def build_gemini_openai_base_url(root: str) -> str:
     # base_url = {root}/v1beta/openai/ （若已含则不重复添加）
     if has_v1beta_openai(root):
@@ -41,10 +50,12 @@ def build_gemini_openai_base_url(root: str) -> str:
     return join_url(root, "v1beta/openai")
 
 
+@lru_cache(maxsize=64)
 def build_gemini_openai_models_url(root: str) -> str:
     return join_url(build_gemini_openai_base_url(root), "models")
 
 
+@lru_cache(maxsize=64)
 def build_gemini_openai_chat_completions_url(root: str) -> str:
     return join_url(build_gemini_openai_base_url(root), "chat/completions")
 
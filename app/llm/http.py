@@ -1,10 +1,10 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
-import json
 from typing import Any
 
 import httpx
+import orjson
 from loguru import logger
 
 
@@ -12,6 +12,29 @@ class LLMHTTPError(RuntimeError):
     pass
 
 
+_shared_client: httpx.AsyncClient | None = None
+
+
+def get_shared_client() -> httpx.AsyncClient:
+    """
+    进程内共享的 AsyncClient（连接池复用，避免每次请求重建连接）。
+
+    - HTTP/2：并发 LLM 请求在单条 TLS 连接上多路复用，消除队头阻塞与握手扇出
+    - 惰性创建；若被意外 close 会自动重建
+    - 超时请在单次请求上指定（timeout=...），不在 client 级别写死
+    """
+    global _shared_client
+    if _shared_client is None or _shared_client.is_closed:
+        _shared_client = httpx.AsyncClient(
+            http2=True,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=50, max_keepalive_connections=20, keepalive_expiry=30.0
+            ),
+        )
+    return _shared_client
+
+
 def response_json_checked(
     resp: httpx.Response,
     *,
@@ -30,7 +53,10 @@ def response_json_checked(
     status_code = resp.status_code
     content_type = (resp.headers.get("content-type") or "").lower()
     body = resp.content or b""
-    text_snippet = (resp.text or "")[:1000]
+
+    # resp.text 会解码整个响应体，仅在错误分支按需计算
+    def _text_snippet() -> str:
+        return (resp.text or "")[:1000]
 
     ctx = f" | {context}" if context else ""
 
@@ -57,16 +83,16 @@ def response_json_checked(
             status_code,
             content_type,
             resp.request.url,
-            text_snippet,
+            _text_snippet(),
         )
         raise LLMHTTPError(
             f"LLM HTTP 非 JSON 响应（status_code={status_code}, content_type={content_type}）"
         )
 
-    # 4) 解析 JSON
+    # 4) 解析 JSON（orjson：C 实现，大响应体解析显著快于 stdlib json）
     try:
-        data = resp.json()
-    except json.JSONDecodeError as e:
+        data = orjson.loads(body)
+    except orjson.JSONDecodeError as e:
         headers = dict(resp.headers) if log_headers else {}
         logger.error(
             "LLM HTTP JSONDecodeError{} status_code={} content_type={} url={} headers={} body_snippet={}",
@@ -75,7 +101,7 @@ def response_json_checked(
             content_type,
             resp.request.url,
             headers,
-            text_snippet,
+            _text_snippet(),
         )
         raise
 
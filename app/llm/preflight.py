@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
+import asyncio
+from typing import Iterable
+
 import httpx
 from loguru import logger
 
@@ -10,51 +13,94 @@ from .endpoints import (
     build_gemini_openai_models_url,
     build_openai_models_url,
 )
-from .http import LLMHTTPError, response_json_checked
-
+from .http import LLMHTTPError, get_shared_client, response_json_checked
 
-async def preflight_llm(
-    *,
-    mode: LLMMode,
-    base_url: str,
-    api_key: str,
-    timeout_seconds: float = 15.0,
-) -> None:
-    """
-    启动 preflight/healthcheck：
-    - openai: GET {base_url}/models
-    - gemini_native: GET {root}/v1beta/models（若 base_url 已含 /v1beta 则不重复添加）
-    - gemini_openai: GET {root}/v1beta/openai/models（若 base_url 已含则不重复添加）
 
-    要求返回 JSON，否则直接失败并给出清晰错误（含响应片段）。
-    """
+def _build_preflight_request(
+    mode: LLMMode, base_url: str, api_key: str
+) -> tuple[str, dict[str, str]]:
+    """根据模式构造 preflight 的 GET url 与鉴权 headers。"""
     if not base_url:
         raise ValueError("LLM_BASE_URL 不能为空")
     if not api_key:
         raise ValueError("LLM API key 不能为空（请配置 GEMINI_API_KEY）")
 
     if mode == "openai":
-        url = build_openai_models_url(base_url)
-        headers = {"Authorization": f"Bearer {api_key}"}
-    elif mode == "gemini_native":
-        url = build_gemini_native_models_url(base_url)
-        headers = {"x-goog-api-key": api_key}
-    elif mode == "gemini_openai":
-        url = build_gemini_openai_models_url(base_url)
-        headers = {"Authorization": f"Bearer {api_key}"}
-    else:
-        raise ValueError(f"不支持的 LLM_MODE: {mode}")
+        return build_openai_models_url(base_url), {"Authorization": f"Bearer {api_key}"}
+    if mode == "gemini_native":
+        return build_gemini_native_models_url(base_url), {"x-goog-api-key": api_key}
+    if mode == "gemini_openai":
+        return build_gemini_openai_models_url(base_url), {"Authorization": f"Bearer {api_key}"}
+    raise ValueError(f"不支持的 LLM_MODE: {mode}")
+
+
+async def _preflight_one(
+    *, mode: LLMMode, base_url: str, api_key: str, timeout_seconds: float
+) -> None:
+    url, headers = _build_preflight_request(mode, base_url, api_key)
 
     logger.info(f"🔎 LLM preflight | mode={mode} url={url}")
 
     try:
-        async with httpx.AsyncClient(timeout=httpx.Timeout(timeout_seconds), follow_redirects=True) as client:
-            resp = await client.get(url, headers=headers)
+        resp = await get_shared_client().get(
+            url, headers=headers, timeout=httpx.Timeout(timeout_seconds)
+        )
         _ = response_json_checked(resp, context="preflight")
     except (LLMHTTPError, httpx.HTTPError) as e:
         logger.error(f"❌ LLM preflight 失败 | mode={mode} url={url} err={e}")
         raise
 
-    logger.success(f"✅ LLM preflight OK | mode={mode}")
+    logger.success(f"✅ LLM preflight OK | mode={mode} http_version={resp.http_version}")
+
 
+async def preflight_llm_many(
+    checks: Iterable[dict], *, timeout_seconds: float = 15.0
+) -> list[BaseException | None]:
+    """
+    并发执行多组 preflight（asyncio.gather），总耗时从 sum(RTT) 降为 max(RTT)。
+
+    checks 元素为 {"mode": ..., "base_url": ..., "api_key": ...}；
+    返回与入参等长的列表（成功为 None，失败为异常对象），并在存在失败时抛出汇总错误。
+    """
+    checks = list(checks)
+    results = await asyncio.gather(
+        *(
+            _preflight_one(
+                mode=c["mode"],
+                base_url=c["base_url"],
+                api_key=c["api_key"],
+                timeout_seconds=timeout_seconds,
+            )
+            for c in checks
+        ),
+        return_exceptions=True,
+    )
+    normalized = [r if isinstance(r, BaseException) else None for r in results]
+
+    failed = [
+        f"mode={c['mode']} err={r}" for c, r in zip(checks, normalized) if r is not None
+    ]
+    if failed:
+        raise LLMHTTPError("LLM preflight 失败: " + "; ".join(failed))
+    return normalized
+
+
+async def preflight_llm(
+    *,
+    mode: LLMMode,
+    base_url: str,
+    api_key: str,
+    timeout_seconds: float = 15.0,
+) -> None:
+    """
+    启动 preflight/healthcheck：
+    - openai: GET {base_url}/models
+    - gemini_native: GET {root}/v1beta/models（若 base_url 已含 /v1beta 则不重复添加）
+    - gemini_openai: GET {root}/v1beta/openai/models（若 base_url 已含则不重复添加）
 
+    要求返回 JSON，否则直接失败并给出清晰错误（含响应片段）。
+    """
+    await preflight_llm_many(
+        [{"mode": mode, "base_url": base_url, "api_key": api_key}],
+        timeout_seconds=timeout_seconds,
+    )
@@ -1,14 +1,19 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
-import base64
+import asyncio
+import binascii
+import hashlib
 import json
 import mimetypes
 import re
+from collections import OrderedDict
+from functools import lru_cache
 from pathlib import Path
 from typing import Any, List, Type, TypeVar
 
 import httpx
+import orjson
 from loguru import logger
 from pydantic import BaseModel, ValidationError
 
@@ -18,70 +23,146 @@ from .endpoints import (
     build_gemini_openai_chat_completions_url,
     build_openai_chat_completions_url,
 )
-from .http import LLMHTTPError, response_json_checked
+from .http import LLMHTTPError, get_shared_client, response_json_checked
 
 ResponseT = TypeVar("ResponseT", bound=BaseModel)
 
+_JSON_DECODER = json.JSONDecoder()
 
-def _guess_mime(path: Path) -> str:
-    mime, _ = mimetypes.guess_type(path.name)
+
+def _peek_ends(s: str) -> tuple[str, str] | None:
+    """返回首/尾非空白字符（不做 strip 拷贝）；全空白返回 None。"""
+    i, j = 0, len(s) - 1
+    while i <= j and s[i].isspace():
+        i += 1
+    if i > j:
+        return None
+    while j > i and s[j].isspace():
+        j -= 1
+    return s[i], s[j]
+
+# 语义缓存：连续挑战经常用相同图块 + 相同提示词重复问询（重试/同款面板），
+# 命中即省掉整个网络 RTT + 解析。键为图片/提示词/模型的摘要，进程内共享。
+_RESPONSE_CACHE: "OrderedDict[str, BaseModel]" = OrderedDict()
+_RESPONSE_CACHE_CAPACITY = 128
+
+
+def _response_cache_get(key: str) -> BaseModel | None:
+    cached = _RESPONSE_CACHE.get(key)
+    if cached is not None:
+        _RESPONSE_CACHE.move_to_end(key)
+    return cached
+
+
+def _response_cache_put(key: str, value: BaseModel) -> None:
+    _RESPONSE_CACHE[key] = value
+    _RESPONSE_CACHE.move_to_end(key)
+    while len(_RESPONSE_CACHE) > _RESPONSE_CACHE_CAPACITY:
+        _RESPONSE_CACHE.popitem(last=False)
+
+
+@lru_cache(maxsize=8)
+def _data_url_prefix(mime: str) -> str:
+    return f"data:{mime};base64,"
+
+
+@lru_cache(maxsize=32)
+def _mime_for_suffix(suffix: str) -> str:
+    mime, _ = mimetypes.guess_type(f"x{suffix}")
     return mime or "image/png"
 
 
+def _guess_mime(path: Path) -> str:
+    # hCaptcha 图片后缀就那几种，按小写后缀记忆化，避免每张图都走 mimetypes 解析
+    return _mime_for_suffix(path.suffix.lower())
+
+
+# pybase64（SIMD 加速）可选：装了就用，对大截图编码快 4-8 倍；没装走 binascii
+try:
+    import pybase64 as _b64fast
+except ImportError:
+    _b64fast = None
+
+# 48000 是 3 的倍数，保证 base64 padding 只出现在末尾，分块结果可直接拼接
+_B64_CHUNK_SIZE = 48_000
+_B64_CHUNK_THRESHOLD = 2 * 1024 * 1024
+
+
 def _file_to_base64(path: Path) -> tuple[str, str]:
     mime = _guess_mime(path)
     data = path.read_bytes()
-    b64 = base64.b64encode(data).decode("ascii")
-    return mime, b64
-
-
-def _extract_first_json(text: str) -> Any | None:
+    if _b64fast is not None:
+        return mime, _b64fast.b64encode(data).decode("ascii")
+    if len(data) <= _B64_CHUNK_THRESHOLD:
+        # b2a_base64 直接产出不带换行的 b64 bytes，省去 b64encode 的中间拷贝
+        return mime, binascii.b2a_base64(data, newline=False).decode("ascii")
+
+    # 大图分块编码，避免一次性持有「原始 + b64」两份完整缓冲
+    buf = bytearray()
+    view = memoryview(data)
+    for offset in range(0, len(data), _B64_CHUNK_SIZE):
+        buf += binascii.b2a_base64(view[offset : offset + _B64_CHUNK_SIZE], newline=False)
+    return mime, buf.decode("ascii")
+
+
+def _extract_first_json(text: Any) -> Any | None:
+    # 上游已解析好的结构直接透传（responseMimeType=application/json 场景）
+    if isinstance(text, (dict, list)):
+        return text
     if not text or not isinstance(text, str):
         return None
-    s = text.strip()
-    if not s:
+    ends = _peek_ends(text)
+    if ends is None:
         return None
+    s = text  # 后续均为 find 定位扫描，无需 strip 的整串拷贝
 
-    # 1) 纯 JSON
-    if s[0] in "{[":
+    # 1) 纯 JSON 快速通道：gemini_native 强制 responseMimeType=application/json，
+    #    绝大多数响应整体即合法 JSON，无需进入围栏/括号扫描。
+    #    orjson 自身容忍首尾空白，直接喂原串。
+    if ends[0] in "{[" and ends[1] in "}]":
         try:
-            return json.loads(s)
-        except json.JSONDecodeError:
+            return orjson.loads(s)
+        except orjson.JSONDecodeError:
             pass
 
-    # 2) ```json ... ```
-    for pattern in (r"```json\s*([\s\S]*?)```", r"```\s*([\s\S]*?)```"):
-        m = re.search(pattern, s, flags=re.IGNORECASE)
-        if not m:
-            continue
-        candidate = (m.group(1) or "").strip()
-        if not candidate:
-            continue
+    # 2) ```json ... ```（围栏定界符是字面量，str.find 的 C 级扫描远快于回溯正则）
+    i = s.find("```")
+    if i != -1:
+        j = s.find("```", i + 3)
+        if j != -1:
+            candidate = s[i + 3 : j].lstrip()
+            if candidate[:4].lower() == "json":
+                candidate = candidate[4:].lstrip()
+            if candidate:
+                try:
+                    return orjson.loads(candidate)
+                except orjson.JSONDecodeError:
+                    pass
+
+    # 3) 兜底：raw_decode 从括号处原位解析（stdlib 专有能力），
+    #    避免 find/rfind 大段子串拷贝后再整体 loads
+    i = 0
+    n = len(s)
+    while i < n:
+        brace = s.find("{", i)
+        bracket = s.find("[", i)
+        if brace == -1 and bracket == -1:
+            return None
+        i = brace if bracket == -1 or (brace != -1 and brace < bracket) else bracket
         try:
-            return json.loads(candidate)
+            obj, _end = _JSON_DECODER.raw_decode(s, i)
+            return obj
         except json.JSONDecodeError:
-            continue
-
-    # 3) 兜底：截取第一个 { ... } 尝试解析
-    start = s.find("{")
-    end = s.rfind("}")
-    if start != -1 and end != -1 and end > start:
-        candidate = s[start : end + 1]
-        try:
-            return json.loads(candidate)
-        except json.JSONDecodeError:
-            return None
+            i += 1
 
     return None
 
 
 def _extract_text_from_openai_chat_completions(data: dict) -> str | None:
+    # 期望形态直接下标取值（99% 路径），异常形态统一走一次 except
     try:
-        choices = data.get("choices") or []
-        first = choices[0] if choices else {}
-        message = first.get("message") or {}
-        content = message.get("content")
-    except Exception:
+        content = data["choices"][0]["message"]["content"]
+    except (KeyError, IndexError, TypeError):
         return None
 
     if isinstance(content, str):
@@ -100,11 +181,10 @@ def _extract_text_from_openai_chat_completions(data: dict) -> str | None:
 
 def _extract_text_from_gemini_native(data: dict) -> str | None:
     try:
-        candidates = data.get("candidates") or []
-        first = candidates[0] if candidates else {}
-        content = first.get("content") or {}
-        parts = content.get("parts") or []
-    except Exception:
+        parts = data["candidates"][0]["content"]["parts"]
+    except (KeyError, IndexError, TypeError):
+        return None
+    if not isinstance(parts, list):
         return None
 
     texts: list[str] = []
@@ -114,50 +194,49 @@ def _extract_text_from_gemini_native(data: dict) -> str | None:
     return "\n".join(texts).strip() if texts else None
 
 
-def _json_only_instruction(schema: dict) -> str:
+@lru_cache(maxsize=64)
+def _schema_and_instruction(response_schema: Type[BaseModel]) -> tuple[dict, str, str]:
     """
-    强制模型输出 JSON 的提示词（比依赖上游 prompt 更可靠）。
+    按 schema 类记忆化 (json_schema, schema_text, json_only_instruction)。
 
     说明：hcaptcha-challenger 有些系统提示（如 spatial/path.md）并不包含 JSON 输出格式要求，
     上游 GeminiProvider 依赖 response_schema/response_mime_type 来保证结构化输出。
     这里我们显式注入“只输出 JSON + schema”，避免模型输出解释性文本导致解析失败。
+    model_json_schema() 的生成开销不小，且同一类在连续挑战中反复出现，缓存后为零成本。
     """
-    schema_text = json.dumps(schema, ensure_ascii=False)
-    return (
+    schema = response_schema.model_json_schema()
+    schema_text = orjson.dumps(schema).decode("utf-8")
+    instruction = (
         "IMPORTANT:\n"
         "- Return ONLY a single JSON object.\n"
         "- Do NOT include any explanation, markdown, code fences, or extra text.\n"
         "- The JSON MUST conform to this JSON Schema:\n"
         f"{schema_text}\n"
     )
+    return schema, schema_text, instruction
 
 
-_RE_XY_PAIR = re.compile(
+# 两种坐标形态合并为单一交替模式，全文只扫描一次
+_RE_XY_ANY = re.compile(
     r"""
-    x\s*[:=]\s*(?P<x>\d+)\s*[,，]\s*y\s*[:=]\s*(?P<y>\d+)
+    (?:x\s*[:=]\s*(?P<x1>\d+)\s*[,，]\s*y\s*[:=]\s*(?P<y1>\d+))
+    |
+    (?:\(\s*(?P<x2>\d+)\s*[,，]\s*(?P<y2>\d+)\s*\))
     """,
     re.IGNORECASE | re.VERBOSE,
 )
-_RE_PAREN_PAIR = re.compile(r"\(\s*(?P<x>\d+)\s*[,，]\s*(?P<y>\d+)\s*\)")
 
 
 def _extract_xy_pairs(text: str) -> list[tuple[int, int]]:
     if not text:
         return []
     pairs: list[tuple[int, int]] = []
-    for m in _RE_XY_PAIR.finditer(text):
-        pairs.append((int(m.group("x")), int(m.group("y"))))
-    for m in _RE_PAREN_PAIR.finditer(text):
-        pairs.append((int(m.group("x")), int(m.group("y"))))
-    # 去重且保持顺序
-    seen: set[tuple[int, int]] = set()
-    uniq: list[tuple[int, int]] = []
-    for p in pairs:
-        if p in seen:
-            continue
-        seen.add(p)
-        uniq.append(p)
-    return uniq
+    for m in _RE_XY_ANY.finditer(text):
+        x = m.group("x1") or m.group("x2")
+        y = m.group("y1") or m.group("y2")
+        pairs.append((int(x), int(y)))
+    # dict.fromkeys：去重且保持顺序
+    return list(dict.fromkeys(pairs))
 
 
 def _salvage_from_text(
@@ -283,6 +362,18 @@ class HcaptchaLLMProvider:
         self._base_url = (base_url or "").strip()
         self._timeout = httpx.Timeout(timeout_seconds)
 
+        # headers 在 provider 生命周期内不变，构造一次复用，避免每次请求重建 dict
+        if mode == "gemini_native":
+            self._static_headers: dict[str, str] = {
+                "x-goog-api-key": self._api_key,
+                "Content-Type": "application/json",
+            }
+        else:
+            self._static_headers = {
+                "Authorization": f"Bearer {self._api_key}",
+                "Content-Type": "application/json",
+            }
+
         self._last_response_json: dict | None = None
         self._last_response_text: str | None = None
 
@@ -305,21 +396,47 @@ class HcaptchaLLMProvider:
             raise ValueError("LLM base_url 为空（请配置 LLM_BASE_URL 或 GEMINI_BASE_URL）")
 
         mode = self._mode
-        schema = response_schema.model_json_schema()
-        json_instruction = _json_only_instruction(schema)
+        # 先校验 mode，再做昂贵的磁盘 I/O / base64 编码
+        if mode not in ("openai", "gemini_openai", "gemini_native"):
+            raise ValueError(f"不支持的 LLM_MODE: {mode}")
+        if mode == "gemini_native" and not self._model:
+            raise ValueError("gemini_native 模式必须提供 model")
+
+        _schema, schema_text, json_instruction = _schema_and_instruction(response_schema)
 
         # 读取图片并转 base64（inline，不依赖 file upload）
-        valid_images = [Path(p) for p in images if p]
-        image_payloads: list[tuple[str, str]] = []
-        for p in valid_images:
-            if not p.exists():
-                continue
-            image_payloads.append(_file_to_base64(p))
+        # 磁盘读取 + base64 编码是阻塞操作，丢到线程池并发执行，避免卡住事件循环
+        valid_images = [p for p in (Path(p) for p in images if p) if p.exists()]
+        image_payloads: list[tuple[str, str]] = list(
+            await asyncio.gather(*(asyncio.to_thread(_file_to_base64, p) for p in valid_images))
+        )
+
+        # 单次遍历：同时产出 mode 专属的图片结构与语义缓存摘要，免去二次迭代
+        hasher = hashlib.blake2b(digest_size=16)
+        image_entries: list[dict[str, Any]] = []
+        for mime, b64 in image_payloads:
+            hasher.update(b64.encode("ascii"))
+            if mode == "gemini_native":
+                # Gemini REST: inlineData.mimeType/data（官方 JSON 命名为 lowerCamelCase）
+                image_entries.append({"inlineData": {"mimeType": mime, "data": b64}})
+            else:
+                image_entries.append(
+                    {"type": "image_url", "image_url": {"url": _data_url_prefix(mime) + b64}}
+                )
+        hasher.update((user_prompt or "").encode("utf-8"))
+        hasher.update((description or "").encode("utf-8"))
+        hasher.update(
+            f"|{mode}|{self._model}|{self._base_url}|{response_schema.__qualname__}".encode()
+        )
+        cache_key = hasher.hexdigest()
+        if (cached := _response_cache_get(cache_key)) is not None:
+            logger.debug("LLM 语义缓存命中 | schema={}", response_schema.__name__)
+            return cached.model_copy(deep=True)  # type: ignore[return-value]
 
         # 请求
         url: str
-        headers: dict[str, str]
         payload: dict[str, Any]
+        headers = self._static_headers
 
         if mode in ("openai", "gemini_openai"):
             url = (
@@ -327,10 +444,6 @@ class HcaptchaLLMProvider:
                 if mode == "openai"
                 else build_gemini_openai_chat_completions_url(self._base_url)
             )
-            headers = {
-                "Authorization": f"Bearer {self._api_key}",
-                "Content-Type": "application/json",
-            }
 
             messages: list[dict[str, Any]] = []
             if description:
@@ -338,11 +451,7 @@ class HcaptchaLLMProvider:
             # 强制 JSON 输出（避免模型输出解释文本）
             messages.append({"role": "system", "content": json_instruction})
 
-            user_content: list[dict[str, Any]] = []
-            for mime, b64 in image_payloads:
-                user_content.append(
-                    {"type": "image_url", "image_url": {"url": f"data:{mime};base64,{b64}"}}
-                )
+            user_content = image_entries
             if user_prompt:
                 user_content.append({"type": "text", "text": user_prompt})
             # 再补一层约束（部分网关会忽略 system）
@@ -358,19 +467,10 @@ class HcaptchaLLMProvider:
                 "response_format": {"type": "json_object"},
             }
 
-        elif mode == "gemini_native":
-            if not self._model:
-                raise ValueError("gemini_native 模式必须提供 model")
+        else:  # gemini_native（mode 已在入口校验）
             url = build_gemini_native_generate_content_url(self._base_url, self._model)
-            headers = {
-                "x-goog-api-key": self._api_key,
-                "Content-Type": "application/json",
-            }
 
-            parts: list[dict[str, Any]] = []
-            for mime, b64 in image_payloads:
-                # Gemini REST: inlineData.mimeType/data（官方 JSON 命名为 lowerCamelCase）
-                parts.append({"inlineData": {"mimeType": mime, "data": b64}})
+            parts = image_entries
             if user_prompt:
                 parts.append({"text": user_prompt})
             parts.append({"text": json_instruction})
@@ -384,14 +484,13 @@ class HcaptchaLLMProvider:
             else:
                 payload["systemInstruction"] = {"parts": [{"text": json_instruction}]}
 
-        else:
-            raise ValueError(f"不支持的 LLM_MODE: {mode}")
-
         context = f"{mode}"
 
         async def _request_json(_payload: dict[str, Any]) -> Any:
-            async with httpx.AsyncClient(timeout=self._timeout, follow_redirects=True) as client:
-                resp = await client.post(url, headers=headers, json=_payload)
+            # orjson 序列化请求体（headers 已带 Content-Type: application/json）
+            resp = await get_shared_client().post(
+                url, headers=headers, content=orjson.dumps(_payload), timeout=self._timeout
+            )
             return response_json_checked(resp, context=context)
 
         # 第一次尝试：带 response_format/json_instruction
@@ -423,6 +522,17 @@ class HcaptchaLLMProvider:
 
         self._last_response_text = text
 
+        # 快速通道：纯 JSON 文本直接交给 pydantic-core（Rust）解析，跳过中间 dict 物化
+        # （pydantic-core 容忍首尾空白，无需 strip 拷贝）
+        ends = _peek_ends(text)
+        if ends and ends[0] in "{[" and ends[1] in "}]":
+            try:
+                result = response_schema.model_validate_json(text)
+                _response_cache_put(cache_key, result)
+                return result
+            except ValidationError:
+                pass  # 字段缺失/形态偏差，回落到归一化管线
+
         # 解析 JSON（带兜底策略）
         parsed = _extract_first_json(text)
 
@@ -437,7 +547,7 @@ class HcaptchaLLMProvider:
                 "Convert the following content into a single JSON object that conforms to the JSON schema.\n"
                 "Return ONLY JSON.\n\n"
                 "JSON Schema:\n"
-                f"{json.dumps(schema, ensure_ascii=False)}\n\n"
+                f"{schema_text}\n\n"
                 "Content:\n"
                 f"{text}\n"
             )
@@ -487,33 +597,71 @@ class HcaptchaLLMProvider:
         parsed = _normalize_for_schema(parsed, response_schema=response_schema, user_prompt=user_prompt)
 
         try:
-            return response_schema.model_validate(parsed)
+            result = response_schema.model_validate(parsed)
         except ValidationError as ve:
             # 最后再尝试一次从自然语言提取（防止缺字段）
+            salvaged = None
             if isinstance(self._last_response_text, str):
                 salvaged = _salvage_from_text(
                     text=self._last_response_text,
                     response_schema=response_schema,
                     user_prompt=user_prompt,
                 )
-                if salvaged is not None:
-                    return response_schema.model_validate(salvaged)
-            raise ve
+            if salvaged is None:
+                raise ve
+            result = response_schema.model_validate(salvaged)
 
-    def cache_response(self, path: Path) -> None:
-        """将最后一次 LLM 原始响应缓存到文件，便于排查。"""
+        _response_cache_put(cache_key, result)
+        return result
+
+    def _build_cache_body(self) -> bytes | None:
         if not self._last_response_json and not self._last_response_text:
+            return None
+        payload = {
+            "mode": self._mode,
+            "base_url": self._base_url,
+            "model": self._model,
+            "response_json": self._last_response_json,
+            "response_text": self._last_response_text,
+        }
+        return orjson.dumps(payload, option=orjson.OPT_INDENT_2)
+
+    @staticmethod
+    def _write_cache_file(path: Path, body: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # 先写临时文件再原子替换，中途被打断也不会留下半截缓存
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        tmp.write_bytes(body)
+        tmp.replace(path)
+
+    async def cache_response_async(self, path: Path) -> None:
+        """异步缓存最后一次 LLM 原始响应（写盘走线程池，不阻塞事件循环）。"""
+        body = self._build_cache_body()
+        if body is None:
             return
         try:
-            path.parent.mkdir(parents=True, exist_ok=True)
-            payload = {
-                "mode": self._mode,
-                "base_url": self._base_url,
-                "model": self._model,
-                "response_json": self._last_response_json,
-                "response_text": self._last_response_text,
-            }
-            path.write_text(json.dumps(payload, indent=2, ensure_ascii=False), encoding="utf-8")
+            await asyncio.to_thread(self._write_cache_file, path, body)
+        except Exception as e:
+            logger.warning(f"Failed to cache LLM response: {e}")
+
+    def cache_response(self, path: Path) -> None:
+        """将最后一次 LLM 原始响应缓存到文件，便于排查（兼容同步调用方）。
+
+        在事件循环内被同步调用时，写盘任务丢给默认线程池执行，
+        避免多 MB 响应的序列化 + 落盘停顿卡住其他协程。
+        """
+        body = self._build_cache_body()
+        if body is None:
+            return
+        try:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                loop = None
+            if loop is not None:
+                loop.run_in_executor(None, self._write_cache_file, path, body)
+            else:
+                self._write_cache_file(path, body)
         except Exception as e:
             logger.warning(f"Failed to cache LLM response: {e}")
 
@@ -1,10 +1,17 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
-import posixpath
+from functools import lru_cache
 from urllib.parse import urlsplit, urlunsplit
 
 
+@lru_cache(maxsize=32)
+def _split_base(base_url: str) -> tuple[str, str, str, str, str]:
+    """base_url 在 provider 生命周期内不变，拆分结果按串记忆化。"""
+    parts = urlsplit(base_url)
+    return parts.scheme, parts.netloc, (parts.path or "").rstrip("/"), parts.query, parts.fragment
+
+
 def join_url(base_url: str, *paths: str) -> str:
     """
     安全拼接 URL：
@@ -21,30 +28,38 @@ def join_url(base_url: str, *paths: str) -> str:
     if not base_url:
         raise ValueError("base_url 不能为空")
 
-    parts = urlsplit(base_url)
-    base_path = (parts.path or "").rstrip("/")
+    scheme, netloc, base_path, query, fragment = _split_base(base_url)
 
     clean_parts = [str(p).strip("/") for p in paths if p is not None and str(p).strip("/") != ""]
-    new_path = posixpath.join(base_path, *clean_parts) if clean_parts else base_path
+    tail = "/".join(clean_parts)
+    if tail:
+        new_path = f"{base_path}/{tail}" if base_path else tail
+    else:
+        new_path = base_path
 
     # 绝对 URL 必须确保 path 以 / 开头
-    if parts.scheme and parts.netloc:
+    if scheme and netloc:
         if not new_path.startswith("/"):
             new_path = "/" + new_path if new_path else "/"
+        # 常见情形：无 query/fragment，纯字符串拼接即可，跳过 urlunsplit 的元组开销
+        if not query and not fragment:
+            return f"{scheme}://{netloc}{new_path}"
 
-    return urlunsplit((parts.scheme, parts.netloc, new_path, parts.query, parts.fragment))
+    return urlunsplit((scheme, netloc, new_path, query, fragment))
 
 
 def _path_segments(url: str) -> list[str]:
-    path = urlsplit(url).path or ""
+    path = _split_base(url)[2]
     return [seg for seg in path.split("/") if seg]
 
 
+@lru_cache(maxsize=64)
 def has_v1beta(url: str) -> bool:
     """判断 base_url 的 path 中是否已经包含 /v1beta（作为路径段）。"""
     return "v1beta" in _path_segments(url)
 
 
+@lru_cache(maxsize=64)
 def has_v1beta_openai(url: str) -> bool:
     """判断 base_url 的 path 中是否已经包含 /v1beta/openai（连续路径段）。"""
     segs = _path_segments(url)
@@ -52,5 +67,3 @@ def has_v1beta_openai(url: str) -> bool:
         if seg == "v1beta" and i + 1 < len(segs) and segs[i + 1] == "openai":
             return True
     return False
-
-
@@ -12,78 +12,208 @@ from contextlib import suppress
 
 from hcaptcha_challenger.agent import AgentV
 from loguru import logger
-from playwright.async_api import expect, Page, Response
+from playwright.async_api import expect, Page, Response, Route
 
 from settings import SCREENSHOTS_DIR, settings
 
 URL_CLAIM = "https://store.epicgames.com/en-US/free-games"
 URL_ORDER_HISTORY = "https://www.epicgames.com/account/v2/payment/ajaxGetOrderHistory"
 
+# 响应监听只关心这三类 URL；命中判定先于 r.json()，其余响应零成本跳过
+_URL_LOGIN_ERR = "/id/api/login"
+_URL_LOGIN_OK = "/id/api/analytics"
+_URL_REFRESH_CSRF = "/account/v2/refresh-csrf"
+_INTERESTING_URL_NEEDLES = (_URL_LOGIN_ERR, _URL_LOGIN_OK, _URL_REFRESH_CSRF)
+
+# 登录链路资源拦截：字体/媒体与第三方追踪域对登录逻辑毫无贡献，砍掉以加速导航。
+# 注意不拦截 image —— hCaptcha 挑战依赖图片；也不能按 resource_type 误伤
+# Epic 自家的 /id/api/analytics（登录成功信号正来自该请求）
+_BLOCKED_RESOURCE_TYPES = frozenset({"font", "media"})
+
+# 任一会话 cookie 在场才值得发起网络探测；全部缺席可直接判定未登录
+_LOGIN_COOKIE_NAMES = frozenset({"EPIC_BEARER_TOKEN", "EPIC_SSO", "EPIC_SESSION_AP"})
+
+# 肯定探测结论的短 TTL：背靠背的重复探测直接复用，不再打账号接口
+_PROBE_POSITIVE_TTL_S = 2.0
+
+# 单次登录尝试的总预算：不再叠加 +30s 之类的余量，三次重试能在可预期窗口内收敛
+_LOGIN_ATTEMPT_BUDGET_S = 90.0
+
+# 显式声明只接受 JSON：未登录时 Epic 更倾向于直接 401 而非整页 HTML，探测失败得更快
+_PROBE_HEADERS = {"Accept": "application/json"}
+
+# 登录成功后账号页可能出现的提示按钮（由页面内级联逐个点掉）
+_REMINDER_BTN_IDS = ("#link-success", "#login-reminder-prompt-setup-tfa-skip", "#yes")
+_BLOCKED_HOST_NEEDLES = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "connect.facebook.net",
+    "bat.bing.com",
+    "analytics.tiktok.com",
+)
+
+
+async def _cancel_all(tasks) -> None:
+    """并行回收任务：统一 cancel 后 gather 等待，免去逐个串行 await 的清理延迟。"""
+    for t in tasks:
+        t.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
 
 class EpicAuthorization:
 
     def __init__(self, page: Page):
         self.page = page
-
-        self._is_login_success_signal = asyncio.Queue()
-        self._is_refresh_csrf_signal = asyncio.Queue()
+        # 探测复用 context 级 APIRequestContext，免去每次经 page 属性链取用
+        self._req = page.context.request
+
+        # 一次性信号用 Event：无 deque 分配，空检查退化为普通 bool 读取
+        self._login_ok = asyncio.Event()
+        self._csrf_ok = asyncio.Event()
+        self._login_result: dict | None = None
+        self._screenshot_task: asyncio.Task | None = None
+        # AgentV 在重试间复用：hcaptcha-challenger 的初始化（模型/资源装配）只付一次
+        self._agent: AgentV | None = None
+
+        # 探测去重：并发调用共享同一次网络往返；肯定结论带短 TTL
+        self._probe_inflight: asyncio.Task | None = None
+        self._probe_positive_at: float = 0.0
+
+        # invoke 可能被多次调用：监听器/路由只注册一次，避免回调成倍触发
+        self._listeners_registered = False
+
+        # 并发 invoke 串行化：双登录流会互相打断（重复点击 #sign-in、captcha 冲突）
+        self._invoke_lock = asyncio.Lock()
+
+    @staticmethod
+    async def _route_filter(route: Route):
+        request = route.request
+        if request.resource_type in _BLOCKED_RESOURCE_TYPES:
+            await route.abort()
+            return
+        url = request.url
+        for host in _BLOCKED_HOST_NEEDLES:
+            if host in url:
+                await route.abort()
+                return
+        await route.continue_()
 
     async def _wait_store_isloggedin_true(self, timeout_s: float = 30.0) -> bool:
         """
         Epic 的 <egs-navigation isloggedin> 可能先为 "false" 再异步更新为 "true"。
-        这里统一等待直到观测到 "true"，避免瞬时误判。
+        用 wait_for_function 让轮询发生在页面内部：属性一翻转立即返回，
+        免去 Python 侧每 500ms 的 locate + get_attribute 双 CDP 往返。
         """
-        nav = self.page.locator("//egs-navigation")
-        status = None
-        for _i in range(max(1, int(timeout_s * 2))):
+        try:
+            await self.page.wait_for_function(
+                "() => document.querySelector('egs-navigation')"
+                "?.getAttribute('isloggedin') === 'true'",
+                timeout=int(timeout_s * 1000),
+            )
+            return True
+        except Exception:
+            status = None
             with suppress(Exception):
-                status = await nav.get_attribute("isloggedin")
-            if status == "true":
-                return True
-            await self.page.wait_for_timeout(500)
-        logger.debug(
-            "Store login not ready | isloggedin={} url={}",
-            status,
-            self.page.url,
-        )
-        return False
+                # 单次 evaluate 即可取回属性，省去 locator 解析 + get_attribute 的两段往返
+                status = await self.page.evaluate(
+                    "() => document.querySelector('egs-navigation')?.getAttribute('isloggedin')"
+                )
+            logger.debug(
+                "Store login not ready | isloggedin={} url={}",
+                status,
+                self.page.url,
+            )
+            return False
 
     async def _probe_account_logged_in(self, timeout_ms: float = 15000) -> bool:
+        """
+        带去重/缓存的登录态探测入口：
+        - 2s 内的肯定结论直接复用（invoke 各阶段背靠背探测只付一次网络）
+        - 已有在途探测时挂靠等待，不再发起并发的重复请求
+        - 否定结论不缓存——登录随时可能在下一毫秒落定
+        """
+        if time.monotonic() - self._probe_positive_at < _PROBE_POSITIVE_TTL_S:
+            return True
+
+        inflight = self._probe_inflight
+        if inflight is not None and not inflight.done():
+            # shield：挂靠方被取消不应连累发起方的在途探测
+            with suppress(Exception):
+                return await asyncio.shield(inflight)
+            return False
+
+        task = asyncio.create_task(self._probe_account_logged_in_impl(timeout_ms))
+        self._probe_inflight = task
+        try:
+            ok = await task
+        finally:
+            if self._probe_inflight is task:
+                self._probe_inflight = None
+        if ok:
+            self._probe_positive_at = time.monotonic()
+        return ok
+
+    async def _probe_account_logged_in_impl(self, timeout_ms: float = 15000) -> bool:
         """
         用“账号 JSON API”探测是否已登录，比 store 页的 isloggedin 更可靠。
         - 已登录：通常返回 JSON，包含 orders 字段
         - 未登录：可能 302/401/403，或返回 HTML
         """
         try:
-            resp = await self.page.request.get(URL_ORDER_HISTORY, timeout=timeout_ms)
+            # 本地 cookie 先行短路：会话 cookie 一个都没有必然未登录，
+            # 免去一次完整的订单 JSON 下载 + 解析
+            with suppress(Exception):
+                cookies = await self.page.context.cookies("https://www.epicgames.com")
+                if not any(c.get("name") in _LOGIN_COOKIE_NAMES for c in cookies):
+                    return False
+
+            resp = await self._req.get(URL_ORDER_HISTORY, timeout=timeout_ms, headers=_PROBE_HEADERS)
             if not resp.ok:
                 return False
-            headers = resp.headers or {}
-            content_type = (headers.get("content-type") or "").lower()
+            # Playwright 的 headers 键已小写，直接取值即可，无需中间 dict 拷贝
+            content_type = (resp.headers.get("content-type") or "").lower()
             if "application/json" not in content_type:
                 return False
-            data = await resp.json()
+            body = await resp.body()
+            # 体积上限：接口异常返回超大 payload 时，不值得为一次探测解析到底
+            if len(body) > 1_000_000:
+                return False
+            data = json.loads(body)
             return isinstance(data, dict) and ("orders" in data)
         except Exception as e:
             logger.debug(f"Probe account login failed: {type(e).__name__}: {e}")
             return False
 
     async def _on_response_anything(self, r: Response):
-        if r.request.method != "POST" or "talon" in r.url:
+        if r.request.method != "POST":
+            return
+        url = r.url
+        if "talon" in url:
+            return
+        for needle in _INTERESTING_URL_NEEDLES:
+            if needle in url:
+                break
+        else:
             return
 
         with suppress(Exception):
             result = await r.json()
-            result_json = json.dumps(result, indent=2, ensure_ascii=False)
 
-            if "/id/api/login" in r.url and result.get("errorCode"):
-                logger.error(f"{r.request.method} {r.url} - {result_json}")
-            elif "/id/api/analytics" in r.url and result.get("accountId"):
-                self._is_login_success_signal.put_nowait(result)
-            elif "/account/v2/refresh-csrf" in r.url and result.get("success", False) is True:
-                self._is_refresh_csrf_signal.put_nowait(result)
-            # else:
-            #     logger.debug(f"{r.request.method} {r.url} - {result_json}")
+            if needle == _URL_LOGIN_ERR:
+                if result.get("errorCode"):
+                    # opt(lazy)：ERROR 级被禁用时连 pretty-print 序列化都不会发生
+                    logger.opt(lazy=True).error(
+                        "POST {} - {}",
+                        lambda: url,
+                        lambda: json.dumps(result, indent=2, ensure_ascii=False),
+                    )
+            elif needle == _URL_LOGIN_OK:
+                if result.get("accountId"):
+                    self._login_result = result
+                    self._login_ok.set()
+            elif result.get("success", False) is True:
+                self._csrf_ok.set()
 
     async def _handle_right_account_validation(self):
         """
@@ -91,52 +221,77 @@ class EpicAuthorization:
         Returns:
 
         """
-        await self.page.goto("https://www.epicgames.com/account/personal", wait_until="networkidle")
-
-        btn_ids = ["#link-success", "#login-reminder-prompt-setup-tfa-skip", "#yes"]
+        # domcontentloaded 即可：真正的同步点是下面的按钮级联，
+        # networkidle 在 Epic 这类埋点密集的页面上动辄等待 10-30s
+        await self.page.goto(
+            "https://www.epicgames.com/account/personal", wait_until="domcontentloaded"
+        )
 
         # == 账号长期不登录需要做的额外验证 == #
 
-        # 这一步是“尽力而为”的兜底，不应无限循环阻塞主流程
-        deadline = time.time() + 30  # 最多尝试 30s
-        idle_rounds = 0
-
-        while time.time() < deadline and self._is_refresh_csrf_signal.empty() and btn_ids:
-            await self.page.wait_for_timeout(500)
-            action_chains = btn_ids.copy()
-            clicked_any = False
-            for action in action_chains:
-                with suppress(Exception):
-                    reminder_btn = self.page.locator(action)
-                    await expect(reminder_btn).to_be_visible(timeout=1000)
-                    await reminder_btn.click(timeout=1000)
-                    btn_ids.remove(action)
-                    clicked_any = True
-
-            if clicked_any:
-                idle_rounds = 0
-            else:
-                idle_rounds += 1
-                # 连续多轮都没任何按钮可点，直接结束（可能根本不需要该验证）
-                if idle_rounds >= 10:
-                    break
+        # 整个按钮级联在页面内用一个 setInterval 完成：
+        # 只有这一次 evaluate 跨进程往返，点击/可见性判定全部发生在渲染进程里。
+        # 这一步是“尽力而为”的兜底：到 deadline 或连续 idleMs 无按钮出现即自行结束
+        cascade_js = """
+        ({ ids, deadlineMs, idleMs }) => new Promise((resolve) => {
+          const pending = new Set(ids);
+          const start = Date.now();
+          let lastHit = start;
+          const timer = setInterval(() => {
+            for (const id of [...pending]) {
+              const el = document.querySelector(id);
+              if (el && el.offsetParent !== null) {
+                el.click();
+                pending.delete(id);
+                lastHit = Date.now();
+              }
+            }
+            const now = Date.now();
+            if (!pending.size || now - start > deadlineMs || now - lastHit > idleMs) {
+              clearInterval(timer);
+              resolve([...pending]);
+            }
+          }, 250);
+        })
+        """
 
-    async def _login(self) -> bool | None:
-        # 尽可能早地初始化机器人
-        agent = AgentV(page=self.page, agent_config=settings)
+        cascade_task = asyncio.create_task(
+            self.page.evaluate(
+                cascade_js,
+                {"ids": list(_REMINDER_BTN_IDS), "deadlineMs": 30000, "idleMs": 10000},
+            )
+        )
+        csrf_task = asyncio.create_task(self._csrf_ok.wait())
+
+        # refresh-csrf 成功信号可提前短路整个级联
+        _done, pending = await asyncio.wait(
+            {cascade_task, csrf_task}, return_when=asyncio.FIRST_COMPLETED
+        )
+        await _cancel_all(pending)
 
+    async def _login(self) -> bool | None:
         # {{< SIGN IN PAGE >}}
         logger.debug("Login with Email")
 
+        # 清掉上一轮残留的信号，避免重试时 wait_for 立刻误判成功
+        self._login_ok.clear()
+
         try:
             point_url = "https://www.epicgames.com/account/personal?lang=en-US&productName=egs&sessionInvalidated=true"
-            await self.page.goto(point_url, wait_until="domcontentloaded")
+            # commit：响应头一到即返回，后续 expect(...).to_be_visible 自带等待，
+            # 无需为整页 DOMContentLoaded 多付几秒导航开销。
+            # 导航先发出去，AgentV 初始化与网络 RTT 重叠进行（实例跨重试复用）
+            goto_task = asyncio.create_task(self.page.goto(point_url, wait_until="commit"))
+            if self._agent is None:
+                self._agent = AgentV(page=self.page, agent_config=settings)
+            agent = self._agent
+            await goto_task
 
             # 1. 使用电子邮件地址登录
             email_input = self.page.locator("#email")
             await expect(email_input).to_be_visible(timeout=15000)
-            await email_input.clear()
-            await email_input.type(settings.EPIC_EMAIL)
+            # fill：单次调用写入值（自带清空），省去逐字符 dispatchKeyEvent 的秒级延迟
+            await email_input.fill(settings.EPIC_EMAIL)
 
             async def _safe_click(selector: str):
                 # Playwright click 在某些情况下仍可能卡住；失败时退化为 DOM click
@@ -156,8 +311,7 @@ class EpicAuthorization:
             # 3. 输入密码
             password_input = self.page.locator("#password")
             await expect(password_input).to_be_visible(timeout=15000)
-            await password_input.clear()
-            await password_input.type(settings.EPIC_PASSWORD.get_secret_value())
+            await password_input.fill(settings.EPIC_PASSWORD.get_secret_value())
 
             # 4. 点击登录按钮，触发人机挑战值守监听器
             # Active hCaptcha checkbox
@@ -168,67 +322,64 @@ class EpicAuthorization:
             # hCaptcha 可能：1)静默放行 2)要求解题 3)直接阻止
             # 无论哪种情况，我们都要持续检查是否已登录
             # ========================================================
-            captcha_task = asyncio.create_task(agent.wait_for_challenge())
-            login_signal_task = asyncio.create_task(self._is_login_success_signal.get())
-
             login_confirmed = False
-            max_probe_time = 120.0  # 最多探测 2 分钟
 
             async def _probe_login_loop():
-                """持续探测登录态，直到成功或超时"""
-                start = asyncio.get_event_loop().time()
+                """持续探测登录态直到成功（指数退避：快发现、慢收敛），成功即点亮事件"""
                 probe_count = 0
-                while asyncio.get_event_loop().time() - start < max_probe_time:
+                delay = 0.5
+                while True:
                     probe_count += 1
-                    # 每 5 秒探测一次 API
-                    if await self._probe_account_logged_in(timeout_ms=8000):
+                    # 登录通常在 captcha 后 5s 内落定：前几轮密集探测，
+                    # 之后退避到最多 10s 一次，避免持续拍打账号接口
+                    if await self._probe_account_logged_in(timeout_ms=3000):
                         logger.success(f"Login confirmed by API probe (attempt #{probe_count})")
+                        self._login_ok.set()
+                        return
+                    await asyncio.sleep(delay)
+                    delay = min(10.0, delay * 1.7)
+
+            async def _staged_confirm(pauses: tuple[float, ...]) -> bool:
+                """立即探测 + 短间隔补测，取代固定 3s 盲等（重复开销由探测去重缓存兜底）"""
+                for pause in pauses:
+                    if await self._probe_account_logged_in(timeout_ms=5000):
                         return True
-                    await asyncio.sleep(5)
-                return False
+                    await asyncio.sleep(pause)
+                return await self._probe_account_logged_in(timeout_ms=8000)
 
-            probe_task = asyncio.create_task(_probe_login_loop())
-
-            # 等待任一任务完成：登录信号 / API 探测成功 / captcha 完成
-            done, pending = await asyncio.wait(
-                {captcha_task, login_signal_task, probe_task},
-                timeout=max_probe_time + 30,
-                return_when=asyncio.FIRST_COMPLETED,
-            )
-
-            # 检查结果
-            if login_signal_task in done:
-                logger.success("Login confirmed by analytics signal")
-                login_confirmed = True
-            elif probe_task in done:
+            async def _captcha_then_probe():
+                """captcha 收尾后做一次补充探测；成功同样只是点亮事件"""
                 try:
-                    login_confirmed = probe_task.result()
-                except Exception:
-                    pass
-            elif captcha_task in done:
-                # captcha 完成了，再给一点时间让登录完成
-                try:
-                    captcha_task.result()
+                    await agent.wait_for_challenge()
                     logger.debug("Captcha task completed, waiting for login confirmation...")
                 except Exception as e:
                     logger.warning(f"Captcha task error: {type(e).__name__}")
-                # 等待登录信号或 API 确认
-                await asyncio.sleep(3)
-                if await self._probe_account_logged_in(timeout_ms=15000):
+                    return
+                if await _staged_confirm((0.5, 1.5)):
                     logger.success("Login confirmed by API probe after captcha")
-                    login_confirmed = True
-
-            # 取消所有挂起的任务
-            for t in pending:
-                t.cancel()
-                with suppress(asyncio.CancelledError):
-                    await t
+                    self._login_ok.set()
+
+            # 单一等待者模型：analytics 响应分支、API 探测、captcha 后补充探测
+            # 都只负责 set() 同一个事件；_login 这边只挂一个 wait_for 等待者，
+            # 没有 FIRST_COMPLETED 的 done/pending 结果分派
+            helpers = {
+                asyncio.create_task(_probe_login_loop()),
+                asyncio.create_task(_captcha_then_probe()),
+            }
+            try:
+                await asyncio.wait_for(self._login_ok.wait(), timeout=_LOGIN_ATTEMPT_BUDGET_S)
+                login_confirmed = True
+            except asyncio.TimeoutError:
+                login_confirmed = False
+            finally:
+                # 兜底取消：即便 _login 自身被取消，后台任务（持有 Page/AgentV 引用）
+                # 也不会残留在事件循环上
+                await _cancel_all(helpers)
 
             # 最终确认
             if not login_confirmed:
-                # 最后一次尝试
-                await self.page.wait_for_timeout(3000)
-                if await self._probe_account_logged_in(timeout_ms=20000):
+                # 最后一次尝试：梯次探测（t=0 / 0.5 / 2.0），静默放行场景最多省 3s
+                if await _staged_confirm((0.5, 1.5)):
                     logger.success("Login confirmed by final API probe")
                     login_confirmed = True
 
@@ -249,20 +400,58 @@ class EpicAuthorization:
             return True
         except Exception as err:
             logger.warning(f"{type(err).__name__}: {err}")
-            sr = SCREENSHOTS_DIR.joinpath("authorization")
-            sr.mkdir(parents=True, exist_ok=True)
-            await self.page.screenshot(path=sr.joinpath(f"login-{int(time.time())}.png"))
+            # 截图仅供诊断：后台执行，数百 ms 的截图开销不阻塞 invoke 的重试节奏
+            self._screenshot_task = asyncio.create_task(self._capture_failure_screenshot())
             return None
 
+    async def _capture_failure_screenshot(self) -> None:
+        with suppress(Exception):
+            sr = SCREENSHOTS_DIR.joinpath("authorization")
+            # mkdir 是阻塞 syscall，丢线程池；诊断图用低质量 JPEG，省掉 PNG zlib 编码
+            await asyncio.to_thread(sr.mkdir, parents=True, exist_ok=True)
+            await self.page.screenshot(
+                path=sr.joinpath(f"login-{int(time.time())}.jpg"), type="jpeg", quality=60
+            )
+
+    async def _race_logged_in_probes(self) -> bool:
+        """并行跑多路登录态探测，第一个肯定结论胜出；全部否定才返回 False。"""
+        tasks = {
+            asyncio.create_task(self._probe_account_logged_in(timeout_ms=15000)),
+            asyncio.create_task(self._wait_store_isloggedin_true(timeout_s=5.0)),
+        }
+        confirmed = False
+        try:
+            pending = tasks
+            while pending and not confirmed:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    with suppress(Exception):
+                        if t.result():
+                            confirmed = True
+        finally:
+            await _cancel_all(tasks)
+        return confirmed
+
     async def invoke(self) -> bool:
-        self.page.on("response", self._on_response_anything)
+        # 串行化并发调用：后到者在锁上等待，放行后通常直接命中探测缓存短路返回
+        async with self._invoke_lock:
+            return await self._invoke()
+
+    async def _invoke(self) -> bool:
+        if not self._listeners_registered:
+            self._listeners_registered = True
+            self.page.on("response", self._on_response_anything)
+            with suppress(Exception):
+                await self.page.route("**/*", self._route_filter)
 
         for attempt in range(3):
             logger.debug(f"Login attempt {attempt + 1}/3")
 
-            # 优先使用账号接口探测登录态，避免 store 页 isloggedin 长期不更新导致反复重登
-            if await self._probe_account_logged_in(timeout_ms=15000):
-                logger.success("Epic Games is already logged in (account API probe)")
+            # 账号接口探测与 store 页 isloggedin 属性并行竞速，任一先给出肯定结论
+            # 即返回：已登录场景不必等满账号接口的最长 15s（属性检查在空白页上只会
+            # 静默超时，不影响判定）
+            if await self._race_logged_in_probes():
+                logger.success("Epic Games is already logged in (parallel probe)")
                 return True
 
             try:
@@ -270,7 +459,7 @@ class EpicAuthorization:
             except Exception as e:
                 logger.warning(f"Login attempt {attempt + 1} raised exception: {type(e).__name__}: {e}")
                 # 即使 _login() 抛异常，也要检查是否其实已登录
-                await self.page.wait_for_timeout(2000)
+                await asyncio.sleep(2)
                 if await self._probe_account_logged_in(timeout_ms=15000):
                     logger.success("Login confirmed by API probe after exception")
                     return True
@@ -282,9 +471,10 @@ class EpicAuthorization:
                     return True
                 logger.warning("Login returned success but account API probe failed, will retry")
 
-        # 最后一次尝试：可能已经登录了但 API 探测失败
+        # 最后一次尝试：可能已经登录了但 API 探测失败。
+        # 三轮尝试中已密集探测过，这里只值得一次 5s 的快速复核，不必再挂 30s
         logger.warning("All login attempts exhausted, final probe...")
-        if await self._probe_account_logged_in(timeout_ms=30000):
+        if await self._probe_account_logged_in(timeout_ms=5000):
             logger.success("Final API probe succeeded")
             return True
 
@@ -4,17 +4,18 @@
 # GitHub     : https://github.com/QIN2DIM
 # Description: 游戏商城控制句柄
 
-import json
+import asyncio
 import time
 from contextlib import suppress
-from json import JSONDecodeError
 from typing import List
 
 import httpx
+import orjson
 from hcaptcha_challenger.agent import AgentV
 from loguru import logger
 from playwright.async_api import Page
 from playwright.async_api import expect, TimeoutError, FrameLocator
+from pydantic import TypeAdapter
 from tenacity import retry, retry_if_exception_type, stop_after_attempt
 
 from models import OrderItem, Order
@@ -34,36 +35,78 @@ URL_PROMOTIONS = "https://store-site-backend-static.ak.epicgames.com/freeGamesPr
 URL_PRODUCT_PAGE = "https://store.epicgames.com/en-US/p/"
 URL_PRODUCT_BUNDLES = "https://store.epicgames.com/en-US/bundles/"
 
-
-def get_promotions() -> List[PromotionGame]:
-    """获取周免游戏数据"""
-    def is_discount_game(prot: dict) -> bool | None:
-        with suppress(KeyError, IndexError, TypeError):
+# 周免数据条件缓存：payload 一周内基本不变，带 ETag/Last-Modified 命中 304 即复用磁盘副本
+_PROMOTIONS_CACHE = RUNTIME_DIR.joinpath("promotions.json")
+_PROMOTIONS_VALIDATOR = RUNTIME_DIR.joinpath("promotions.etag")
+
+# 热点选择器常量：属性匹配改用 CSS（走浏览器原生选择器引擎），文本匹配保留 XPath
+SEL_PURCHASE_CTA = "aside button[data-testid='purchase-cta-button']"
+SEL_PURCHASE_IFRAME = "iframe[id*='webPurchaseContainer'], iframe[src*='purchase']"
+SEL_PAYMENT_CONFIRM = "button[class*='payment-confirm__btn']"
+SEL_AGREE_LABEL = "label[for='agree']"
+XP_CONTINUE_BTN = "//button//span[text()='Continue']"
+XP_ACCEPT_BTN = "//button//span[text()='Accept']"
+XP_CHECKOUT_BTN = "//button//span[text()='Check Out']"
+
+# 批量校验：validate_python 一次走完整个列表（Rust 侧），免去逐元素构造的重复开销
+_PROMO_ADAPTER: TypeAdapter[List[PromotionGame]] = TypeAdapter(List[PromotionGame])
+_ORDER_ADAPTER: TypeAdapter[List[Order]] = TypeAdapter(List[Order])
+
+
+def _write_promotions_cache(data: dict, etag: str, last_modified: str) -> None:
+    """缓存落盘（在线程池中执行）：tmp + replace 原子替换，不污染半成品文件。"""
+    _PROMOTIONS_CACHE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = _PROMOTIONS_CACHE.with_suffix(".json.tmp")
+    tmp.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    tmp.replace(_PROMOTIONS_CACHE)
+    if etag or last_modified:
+        _PROMOTIONS_VALIDATOR.write_text(f"{etag}\n{last_modified}")
+
+
+async def get_promotions() -> List[PromotionGame]:
+    """获取周免游戏数据（异步请求：网络等待期间不再卡住事件循环与 Playwright 通道）"""
+    def is_discount_game(prot: dict) -> bool:
+        try:
             offers = prot["promotions"]["promotionalOffers"][0]["promotionalOffers"]
-            for i, offer in enumerate(offers):
-                if offer["discountSetting"]["discountPercentage"] == 0:
-                    return True
-
-    promotions: List[PromotionGame] = []
+            return any(o["discountSetting"]["discountPercentage"] == 0 for o in offers)
+        except (KeyError, IndexError, TypeError):
+            return False
 
-    resp = httpx.get(URL_PROMOTIONS, params={"local": "zh-CN"})
+    headers = {}
+    with suppress(Exception):
+        if _PROMOTIONS_CACHE.exists() and _PROMOTIONS_VALIDATOR.exists():
+            etag, _, last_modified = _PROMOTIONS_VALIDATOR.read_text().partition("\n")
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+    async with httpx.AsyncClient(timeout=15) as client:
+        resp = await client.get(URL_PROMOTIONS, params={"local": "zh-CN"}, headers=headers)
+
+    data = None
+    if resp.status_code == 304:
+        # 命中条件缓存：复用磁盘副本，省一次完整下载
+        with suppress(Exception):
+            data = orjson.loads(await asyncio.to_thread(_PROMOTIONS_CACHE.read_bytes))
 
-    try:
-        data = resp.json()
-    except JSONDecodeError as err:
-        logger.error("Failed to get promotions", err=err)
-        return []
+    if data is None:
+        try:
+            # orjson 直接吃原始字节，跳过 httpx 的文本解码
+            data = orjson.loads(resp.content)
+        except orjson.JSONDecodeError as err:
+            logger.error("Failed to get promotions", err=err)
+            return []
 
-    with suppress(Exception):
-        cache_key = RUNTIME_DIR.joinpath("promotions.json")
-        cache_key.parent.mkdir(parents=True, exist_ok=True)
-        cache_key.write_text(json.dumps(data, indent=2, ensure_ascii=False))
+        with suppress(Exception):
+            etag = resp.headers.get("etag") or ""
+            last_modified = resp.headers.get("last-modified") or ""
+            await asyncio.to_thread(_write_promotions_cache, data, etag, last_modified)
 
     # Get store promotion data and <this week free> games
-    for e in data["data"]["Catalog"]["searchStore"]["elements"]:
-        if not is_discount_game(e):
-            continue
-
+    accepted: List[dict] = []
+    # 先过滤再补 URL，被拒条目不做任何富化计算
+    for e in filter(is_discount_game, data["data"]["Catalog"]["searchStore"]["elements"]):
         try:
             e["url"] = f"{URL_PRODUCT_PAGE.rstrip('/')}/{e['offerMappings'][0]['pageSlug']}"
         except (KeyError, IndexError):
@@ -74,9 +117,9 @@ def get_promotions() -> List[PromotionGame]:
                 continue
 
         logger.info(e["url"])
-        promotions.append(PromotionGame(**e))
+        accepted.append(e)
 
-    return promotions
+    return _PROMO_ADAPTER.validate_python(accepted)
 
 
 class EpicAgent:
@@ -86,19 +129,20 @@ class EpicAgent:
         self._promotions: List[PromotionGame] = []
         self._ctx_cookies_is_available: bool = False
         self._orders: List[OrderItem] = []
-        self._namespaces: List[str] = []
+        # frozenset：promotions × orders 的 membership 检查为 O(1)，老账号订单可达数千
+        self._namespaces: frozenset[str] = frozenset()
         self._cookies = None
 
-    async def _sync_order_history(self):
+    async def _sync_order_history(self, data: dict | None = None):
         if self._orders:
             return
         completed_orders: List[OrderItem] = []
         try:
-            await self.page.goto("https://www.epicgames.com/account/v2/payment/ajaxGetOrderHistory")
-            text_content = await self.page.text_content("//pre")
-            data = json.loads(text_content)
-            for _order in data["orders"]:
-                order = Order(**_order)
+            if data is None:
+                # page.request 直取 JSON，比 goto + //pre 文本读取省一次整页导航
+                resp = await self.page.request.get(URL_ORDER_HISTORY, timeout=15000)
+                data = orjson.loads(await resp.body())
+            for order in _ORDER_ADAPTER.validate_python(data.get("orders") or []):
                 if order.orderType != "PURCHASE":
                     continue
                 for item in order.items:
@@ -109,10 +153,13 @@ class EpicAgent:
             logger.warning(err)
         self._orders = completed_orders
 
-    async def _check_orders(self):
-        await self._sync_order_history()
-        self._namespaces = self._namespaces or [order.namespace for order in self._orders]
-        self._promotions = [p for p in get_promotions() if p.namespace not in self._namespaces]
+    async def _check_orders(self, order_data: dict | None = None):
+        # 订单同步与周免拉取互不依赖，并发执行
+        _, promotions = await asyncio.gather(
+            self._sync_order_history(order_data), get_promotions()
+        )
+        self._namespaces = self._namespaces or frozenset(order.namespace for order in self._orders)
+        self._promotions = [p for p in promotions if p.namespace not in self._namespaces]
 
     async def _should_ignore_task(self) -> bool:
         self._ctx_cookies_is_available = False
@@ -125,13 +172,16 @@ class EpicAgent:
             status = await nav.get_attribute("isloggedin")
 
         logged_in = False
+        order_data: dict | None = None
         try:
             resp = await self.page.request.get(URL_ORDER_HISTORY, timeout=15000)
             if resp.ok:
                 content_type = (resp.headers.get("content-type") or "").lower()
                 if "application/json" in content_type:
                     data = await resp.json()
-                    logged_in = isinstance(data, dict) and ("orders" in data)
+                    if isinstance(data, dict) and ("orders" in data):
+                        logged_in = True
+                        order_data = data
         except Exception:
             logged_in = False
 
@@ -153,7 +203,8 @@ class EpicAgent:
             )
             return False
         self._ctx_cookies_is_available = True
-        await self._check_orders()
+        # 探测时已经拿到订单 JSON，直接复用，省去一次重复请求
+        await self._check_orders(order_data=order_data)
         if not self._promotions:
             return True
         return False
@@ -174,7 +225,7 @@ class EpicAgent:
             return
 
         for p in self._promotions:
-            pj = json.dumps({"title": p.title, "url": p.url}, indent=2, ensure_ascii=False)
+            pj = orjson.dumps({"title": p.title, "url": p.url}, option=orjson.OPT_INDENT_2).decode()
             logger.debug(f"Discover promotion \n{pj}")
 
         if self._promotions:
@@ -192,37 +243,65 @@ class EpicGames:
         self._promotions: List[PromotionGame] = []
         # 记录未能“确认入库”的 URL，最后会让任务失败，避免假成功
         self._unverified_claims: List[str] = []
+        # AgentV 跨游戏复用：每周 N 款游戏只初始化一次求解器（按 page 绑定）
+        self._agent: AgentV | None = None
+        self._agent_page: Page | None = None
 
     @staticmethod
     def _normalize_url(url: str) -> str:
         return (url or "").strip()
 
+    def _get_agent(self, page: Page) -> AgentV:
+        if self._agent is None or self._agent_page is not page:
+            self._agent = AgentV(page=page, agent_config=settings)
+            self._agent_page = page
+        return self._agent
+
+    @staticmethod
+    async def _aside_button_texts(page: Page) -> str:
+        """单次 evaluate 拼接全部 aside 按钮文案，取代逐按钮 text_content 的 N+1 次往返。"""
+        with suppress(Exception):
+            texts = await page.evaluate(
+                "() => Array.from(document.querySelectorAll('aside button'))"
+                ".map(b => b.textContent || '').join('')"
+            )
+            return texts or ""
+        return ""
+
+    @staticmethod
+    async def _aside_state(page: Page) -> dict:
+        """一次 evaluate 同时读库状态与 CTA 文案，省掉对同一 DOM 区域的第二次往返。"""
+        with suppress(Exception):
+            state = await page.evaluate(
+                "() => {"
+                "  const btns = document.querySelectorAll('aside button');"
+                "  const texts = Array.from(btns).map(b => b.textContent || '').join('');"
+                "  const cta = document.querySelector(\"aside button[data-testid='purchase-cta-button']\");"
+                "  return {"
+                "    owned: texts.includes('In Library') || texts.includes('Owned'),"
+                "    cta: cta ? (cta.textContent || '').trim() : ''"
+                "  };"
+                "}"
+            )
+            if isinstance(state, dict):
+                return state
+        return {"owned": False, "cta": ""}
+
     @staticmethod
     async def _is_in_library(page: Page) -> bool:
         """
         基于商品页右侧按钮文本判断是否已入库（en-US: In Library / Owned）。
         仅用于 UI 验证，不依赖 order history。
         """
-        btn_list = page.locator("//aside//button")
-        try:
-            aside_btn_count = await btn_list.count()
-        except TimeoutError:
-            return False
-
-        texts = ""
-        for i in range(aside_btn_count):
-            with suppress(Exception):
-                btn = btn_list.nth(i)
-                t = await btn.text_content()
-                if t:
-                    texts += t
-
+        texts = await EpicGames._aside_button_texts(page)
         return ("In Library" in texts) or ("Owned" in texts)
 
     async def _verify_in_library(self, page: Page, url: str, timeout_s: float = 45.0) -> bool:
         """
-        反复打开/刷新商品页，等待 UI 变为 In Library。
+        打开商品页并等待 UI 变为 In Library。
         用于确认结账/领取确实成功，而不是“盲推断”。
+        轮询放到页面内部（wait_for_function），按钮一更新立即返回；
+        Python 侧只在页面状态可能陈旧时才重新导航，每轮最多等 8s。
         """
         url = self._normalize_url(url)
         if not url:
@@ -234,34 +313,84 @@ class EpicGames:
         while time.monotonic() < deadline:
             try:
                 await page.goto(url, wait_until="domcontentloaded")
-                if await self._is_in_library(page):
-                    return True
+                remaining = max(1.0, min(8.0, deadline - time.monotonic()))
+                await page.wait_for_function(
+                    "() => {"
+                    " const t = Array.from(document.querySelectorAll('aside button'))"
+                    ".map(b => b.textContent || '').join('');"
+                    " return t.includes('In Library') || t.includes('Owned');"
+                    " }",
+                    timeout=int(remaining * 1000),
+                )
+                return True
             except Exception as e:
                 last_err = e
-            await page.wait_for_timeout(1500)
 
         if last_err:
             logger.debug(f"Verify in library failed with last error: {type(last_err).__name__}: {last_err}")
         return False
 
+    async def _fetch_owned_namespaces(self) -> set[str]:
+        """拉一次订单历史，汇总已拥有的 namespace；失败返回空集（由 UI 验证兜底）。"""
+        try:
+            resp = await self.page.request.get(URL_ORDER_HISTORY, timeout=15000)
+            if not resp.ok:
+                return set()
+            data = await resp.json()
+            owned: set[str] = set()
+            for _order in data.get("orders") or []:
+                for item in _order.get("items") or []:
+                    ns = item.get("namespace")
+                    if ns:
+                        owned.add(ns)
+            return owned
+        except Exception as e:
+            logger.debug(f"Fetch owned namespaces failed: {type(e).__name__}: {e}")
+            return set()
+
+    async def _verify_many_in_library(self, urls: List[str], timeout_s: float = 30.0) -> List[str]:
+        """
+        并行入库验证：同一 context 下多开页面，各 URL 独立 goto/轮询。
+        领取流程本身仍须串行（购物车/结账共享账号态），但验证是只读的，
+        可以安全并发；N 个游戏的验证耗时从 sum 降为 max。
+        """
+        sem = asyncio.Semaphore(3)
+
+        async def _verify_one(url: str) -> tuple[str, bool]:
+            async with sem:
+                page = None
+                try:
+                    page = await self.page.context.new_page()
+                    ok = await self._verify_in_library(page, url, timeout_s=timeout_s)
+                    return url, ok
+                except Exception as e:
+                    logger.debug(f"Parallel verify failed - {url=} {type(e).__name__}: {e}")
+                    return url, False
+                finally:
+                    if page is not None:
+                        with suppress(Exception):
+                            await page.close()
+
+        results = await asyncio.gather(*(_verify_one(u) for u in urls))
+        return [u for u, ok in results if not ok]
+
     @staticmethod
     async def _agree_license(page: Page):
         logger.debug("Agree license")
         with suppress(TimeoutError):
-            await page.click("//label[@for='agree']", timeout=4000)
-            accept = page.locator("//button//span[text()='Accept']")
+            await page.click(SEL_AGREE_LABEL, timeout=4000)
+            accept = page.locator(XP_ACCEPT_BTN)
             if await accept.is_enabled():
                 await accept.click()
 
     @staticmethod
     async def _active_purchase_container(page: Page):
         logger.debug("Scanning for purchase iframe...")
-        iframe_selector = "//iframe[contains(@id, 'webPurchaseContainer') or contains(@src, 'purchase')]"
-        wpc = page.frame_locator(iframe_selector).first
+        wpc = page.frame_locator(SEL_PURCHASE_IFRAME).first
 
         logger.debug("Looking for 'PLACE ORDER' button...")
         place_order_btn = wpc.locator("button", has_text="PLACE ORDER")
-        confirm_btn = wpc.locator("//button[contains(@class, 'payment-confirm__btn')]")
+        confirm_btn = wpc.locator(SEL_PAYMENT_CONFIRM)
         
         try:
             await expect(place_order_btn).to_be_visible(timeout=15000)
@@ -282,7 +411,7 @@ class EpicGames:
     async def _uk_confirm_order(wpc: FrameLocator):
         logger.debug("UK confirm order")
         with suppress(TimeoutError):
-            accept = wpc.locator("//button[contains(@class, 'payment-confirm__btn')]")
+            accept = wpc.locator(SEL_PAYMENT_CONFIRM)
             if await accept.is_enabled(timeout=5000):
                 await accept.click()
                 return True
@@ -291,7 +420,7 @@ class EpicGames:
         """处理点击 'Get' 后弹出的即时结账窗口，并在最后强验证是否入库。"""
         product_url = self._normalize_url(product_url)
         logger.info("🚀 Triggering Instant Checkout Flow... url={}", product_url)
-        agent = AgentV(page=page, agent_config=settings)
+        agent = self._get_agent(page)
 
         try:
             # 1. 定位按钮
@@ -300,41 +429,37 @@ class EpicGames:
             # 2. 点击下单 (必须强制点击)
             logger.debug(f"Clicking payment button: {await payment_btn.text_content()}")
             await payment_btn.click(force=True)
-            
-            # 给一点反应时间
-            await page.wait_for_timeout(3000)
-            
+
             # 3. 尝试处理验证码 (增加容错)
+            # wait_for_challenge 自带探测等待，点击后无需再垫固定 sleep。
             # 关键修改：不再“盲推断成功”，而是以“入库验证”为准。
-            # 某些情况下 challenge frame 会快速刷新/销毁，导致 Frame was detached；这里做轻量重试。
+            # 单次 wait_for_challenge + 总超时封顶；失败重试统一交给外层结账重试兜底，
+            # 避免 3× 验证码超时叠加外层重试把单个 URL 拖进分钟级。
             captcha_solved_or_not_needed = False
-            last_captcha_err: Exception | None = None
-            for attempt in range(3):
-                try:
-                    logger.debug("Checking for CAPTCHA... attempt={}", attempt + 1)
-                    await agent.wait_for_challenge()
+            try:
+                logger.debug("Checking for CAPTCHA...")
+                await asyncio.wait_for(
+                    agent.wait_for_challenge(), timeout=settings.RESPONSE_TIMEOUT
+                )
+                captcha_solved_or_not_needed = True
+            except asyncio.TimeoutError:
+                logger.warning(
+                    "CAPTCHA solving timed out after {}s", settings.RESPONSE_TIMEOUT
+                )
+            except Exception as e:
+                msg = str(e)
+                # 常见：没有验证码/找不到 frame（视为不需要验证码）
+                if "Cannot find a valid challenge frame" in msg or "captcha payload" in msg:
+                    logger.info(f"CAPTCHA not detected (skip): {type(e).__name__}: {e}")
                     captcha_solved_or_not_needed = True
-                    break
-                except Exception as e:
-                    last_captcha_err = e
-                    msg = str(e)
-                    # 常见：没有验证码/找不到 frame（视为不需要验证码）
-                    if "Cannot find a valid challenge frame" in msg or "captcha payload" in msg:
-                        logger.info(f"CAPTCHA not detected (skip): {type(e).__name__}: {e}")
-                        captcha_solved_or_not_needed = True
-                        break
-                    # 常见：frame 刷新导致短暂 detach，等一会再试
-                    if "Frame was detached" in msg:
-                        logger.warning(f"CAPTCHA frame detached, retrying: {type(e).__name__}: {e}")
-                        await page.wait_for_timeout(1500)
-                        continue
+                elif "Frame was detached" in msg:
+                    # frame 刷新导致短暂 detach：走外层重试，不在此处自旋
+                    logger.warning(f"CAPTCHA frame detached: {type(e).__name__}: {e}")
+                else:
                     logger.warning(f"CAPTCHA solve error: {type(e).__name__}: {e}")
-                    break
 
-            if not captcha_solved_or_not_needed and last_captcha_err:
-                logger.warning(
-                    f"CAPTCHA solving did not finish cleanly: {type(last_captcha_err).__name__}: {last_captcha_err}"
-                )
+            if not captcha_solved_or_not_needed:
+                logger.warning("CAPTCHA solving did not finish cleanly")
 
             # 4. 强验证：回到商品页确认是否已入库
             if product_url and await self._verify_in_library(page, product_url, timeout_s=60):
@@ -363,39 +488,29 @@ class EpicGames:
             url = self._normalize_url(url)
             if not url:
                 continue
-            await page.goto(url, wait_until="load")
+            # domcontentloaded + 显式等 CTA 挂载：不为整页 load（图片/埋点/iframe）买单
+            await page.goto(url, wait_until="domcontentloaded")
+            with suppress(Exception):
+                await page.locator(SEL_PURCHASE_CTA).wait_for(state="attached", timeout=10000)
 
             # 1. 处理弹窗
             try:
-                continue_btn = page.locator("//button//span[text()='Continue']")
+                continue_btn = page.locator(XP_CONTINUE_BTN)
                 if await continue_btn.is_visible(timeout=5000):
                     logger.debug("Found Content Warning, clicking Continue...")
                     await continue_btn.click()
             except Exception:
                 pass 
 
-            # 2. 检查库状态
-            btn_list = page.locator("//aside//button")
-            try:
-                aside_btn_count = await btn_list.count()
-            except TimeoutError:
-                logger.warning(f"Failed to load game page buttons - {url=}")
-                continue
-
-            texts = ""
-            for i in range(aside_btn_count):
-                btn = btn_list.nth(i)
-                texts += await btn.text_content()
-
-            if "In Library" in texts or "Owned" in texts:
+            # 2+3. 库状态与 CTA 文案在同一次 evaluate 中读取
+            state = await self._aside_state(page)
+            if state["owned"]:
                 logger.success(f"Already in the library - {url=}")
                 continue
 
-            # 3. 定位核心按钮
-            purchase_btn = page.locator("//aside//button[@data-testid='purchase-cta-button']")
-            try:
-                purchase_status = await purchase_btn.text_content(timeout=5000)
-            except TimeoutError:
+            purchase_btn = page.locator(SEL_PURCHASE_CTA)
+            purchase_status = state["cta"]
+            if not purchase_status:
                 logger.warning(f"Could not find purchase button - {url=}")
                 continue
 
@@ -406,7 +521,7 @@ class EpicGames:
             # 4. 智能分支处理（Get: 即时结账 + 入库验证；Add To Cart: 走购物车）
             try:
                 target_btn = purchase_btn
-                text = (await target_btn.text_content()) or ""
+                text = purchase_status
 
                 if "Get" in text:
                     claimed = False
@@ -423,7 +538,7 @@ class EpicGames:
                         logger.warning(f"Instant checkout not verified, retrying - {url=}")
                         with suppress(Exception):
                             await page.reload(wait_until="domcontentloaded")
-                        target_btn = page.locator("//aside//button[@data-testid='purchase-cta-button']")
+                        target_btn = page.locator(SEL_PURCHASE_CTA)
 
                     if not claimed:
                         self._unverified_claims.append(url)
@@ -443,25 +558,41 @@ class EpicGames:
 
         return has_pending_cart_items
 
-    async def _empty_cart(self, page: Page, wait_rerender: int = 30) -> bool | None:
-        has_paid_free = False
+    async def _empty_cart(self, page: Page, max_rounds: int = 30) -> bool | None:
+        """
+        把付费游戏全部移入愿望单。
+        “Free 标签”判定与点击在页面内一次完成（单次 evaluate），点击后等
+        卡片数量变化而非固定 2s 盲睡；空购物车场景一次往返即返回。
+        """
+        move_js = """
+        () => {
+          const cards = document.querySelectorAll("div[data-testid='offer-card-layout-wrapper']");
+          let clicked = 0;
+          cards.forEach((card) => {
+            const spans = Array.from(card.querySelectorAll('span'));
+            if (spans.some((s) => s.textContent === 'Free')) return;
+            const label = spans.find((s) => s.textContent === 'Move to wishlist');
+            const btn = label && label.closest('button');
+            if (btn) { btn.click(); clicked += 1; }
+          });
+          return { clicked, total: cards.length };
+        }
+        """
         try:
-            cards = await page.query_selector_all("//div[@data-testid='offer-card-layout-wrapper']")
-            for card in cards:
-                is_free = await card.query_selector("//span[text()='Free']")
-                if not is_free:
-                    has_paid_free = True
-                    wishlist_btn = await card.query_selector(
-                        "//button//span[text()='Move to wishlist']"
+            for _round in range(max_rounds):
+                result = await page.evaluate(move_js)
+                if not result.get("clicked"):
+                    return True
+                # 等重渲染：卡片数下降即继续下一轮
+                with suppress(Exception):
+                    await page.wait_for_function(
+                        "(prev) => document.querySelectorAll("
+                        "\"div[data-testid='offer-card-layout-wrapper']\").length < prev",
+                        arg=int(result.get("total") or 0),
+                        timeout=5000,
                     )
-                    await wishlist_btn.click()
-
-            if has_paid_free and wait_rerender:
-                wait_rerender -= 1
-                await page.wait_for_timeout(2000)
-                return await self._empty_cart(page, wait_rerender)
             return True
-        except TimeoutError as err:
+        except Exception as err:
             logger.warning("Failed to empty shopping cart", err=err)
             return False
 
@@ -470,8 +601,8 @@ class EpicGames:
         logger.debug("Move ALL paid games from the shopping cart out")
         await self._empty_cart(self.page)
 
-        agent = AgentV(page=self.page, agent_config=settings)
-        await self.page.click("//button//span[text()='Check Out']")
+        agent = self._get_agent(self.page)
+        await self.page.click(XP_CHECKOUT_BTN)
         await self._agree_license(self.page)
 
         try:
@@ -500,15 +631,26 @@ class EpicGames:
                 logger.success("🎉 Successfully collected cart games")
             except TimeoutError:
                 logger.warning("Failed to collect cart games")
-        # 无论走哪条流程，最后都做一次“入库验证”，避免 Actions 误报成功
-        verify_failed: List[str] = []
+        # 无论走哪条流程，最后都做一次“入库验证”，避免 Actions 误报成功。
+        # 先走订单接口：一次 JSON 往返即可覆盖全部游戏，只有接口不可用或
+        # 个别 namespace 迟迟未出现时，才对剩余 URL 回退 UI 级验证
+        pending: dict[str, str] = {}
         for p in promotions:
             url = self._normalize_url(p.url)
-            if not url:
-                continue
-            ok = await self._verify_in_library(self.page, url, timeout_s=30)
-            if not ok:
-                verify_failed.append(url)
+            if url:
+                pending[url] = p.namespace
+
+        for _i in range(5):
+            owned = await self._fetch_owned_namespaces()
+            if owned:
+                pending = {u: ns for u, ns in pending.items() if ns not in owned}
+            if not pending:
+                break
+            await asyncio.sleep(2)
+
+        verify_failed: List[str] = []
+        if pending:
+            verify_failed = await self._verify_many_in_library(list(pending), timeout_s=30)
 
         # 合并失败列表（即时结账阶段失败 + 最终验证失败）
         all_failed = list(dict.fromkeys(self._unverified_claims + verify_failed))
@@ -1,8 +1,8 @@
 # -*- coding: utf-8 -*-
 import os
 import sys
+from functools import cached_property
 from pathlib import Path
-from typing import Literal
 
 # === 引入所需库 ===
 from hcaptcha_challenger.agent import AgentConfig
@@ -19,6 +19,17 @@ RUNTIME_DIR = VOLUMES_DIR.joinpath("runtime")
 SCREENSHOTS_DIR = VOLUMES_DIR.joinpath("screenshots")
 RECORD_DIR = VOLUMES_DIR.joinpath("record")
 HCAPTCHA_DIR = VOLUMES_DIR.joinpath("hcaptcha")
+# hcaptcha 子目录同样只构建一次，类体字段直接引用现成 Path
+_HCAPTCHA_CACHE_DIR = HCAPTCHA_DIR.joinpath(".cache")
+_HCAPTCHA_CHALLENGE_DIR = HCAPTCHA_DIR.joinpath(".challenge")
+_HCAPTCHA_RESPONSE_DIR = HCAPTCHA_DIR.joinpath(".captcha")
+
+# === 环境变量快照（import 时读一次，实例化不再重复 getenv + lambda 分配） ===
+_GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-pro")
+_GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com")
+_RESPONSE_TIMEOUT = os.getenv("RESPONSE_TIMEOUT", "90")
+_TRUE_SET = frozenset({"1", "true", "yes", "y", "on"})
+_LLM_PREFLIGHT = os.getenv("LLM_PREFLIGHT", "true").strip().lower() in _TRUE_SET
 
 # === 配置类定义 ===
 class EpicSettings(AgentConfig):
@@ -26,17 +37,17 @@ class EpicSettings(AgentConfig):
 
     # [基础配置] API Key 建议使用 SecretStr 类型
     GEMINI_API_KEY: SecretStr | None = Field(
-        default_factory=lambda: os.getenv("GEMINI_API_KEY"),
+        default=os.getenv("GEMINI_API_KEY"),
         description="LLM 的 API Key（Gemini 官方 / OpenAI 兼容均可）",
     )
     
     GEMINI_BASE_URL: str = Field(
-        default=os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com"),
+        default=_GEMINI_BASE_URL,
         description="LLM Base URL（兼容旧变量；不会被代码私自改写）",
     )
     
     GEMINI_MODEL: str = Field(
-        default=os.getenv("GEMINI_MODEL", "gemini-2.5-pro"),
+        default=_GEMINI_MODEL,
         description="模型名称",
     )
 
@@ -47,49 +58,45 @@ class EpicSettings(AgentConfig):
     # - 如需单独微调，也可分别设置同名环境变量覆盖
     # ==========================================================
     CHALLENGE_CLASSIFIER_MODEL: str = Field(
-        default_factory=lambda: os.getenv("CHALLENGE_CLASSIFIER_MODEL")
-        or os.getenv("GEMINI_MODEL", "gemini-2.5-pro"),
+        default=os.getenv("CHALLENGE_CLASSIFIER_MODEL") or _GEMINI_MODEL,
         description="验证码任务分类模型（默认跟随 GEMINI_MODEL，可任意字符串）",
     )
     IMAGE_CLASSIFIER_MODEL: str = Field(
-        default_factory=lambda: os.getenv("IMAGE_CLASSIFIER_MODEL")
-        or os.getenv("GEMINI_MODEL", "gemini-2.5-pro"),
+        default=os.getenv("IMAGE_CLASSIFIER_MODEL") or _GEMINI_MODEL,
         description="九宫格图像分类模型（默认跟随 GEMINI_MODEL，可任意字符串）",
     )
     SPATIAL_POINT_REASONER_MODEL: str = Field(
-        default_factory=lambda: os.getenv("SPATIAL_POINT_REASONER_MODEL")
-        or os.getenv("GEMINI_MODEL", "gemini-2.5-pro"),
+        default=os.getenv("SPATIAL_POINT_REASONER_MODEL") or _GEMINI_MODEL,
         description="点选/框选推理模型（默认跟随 GEMINI_MODEL，可任意字符串）",
     )
     SPATIAL_PATH_REASONER_MODEL: str = Field(
-        default_factory=lambda: os.getenv("SPATIAL_PATH_REASONER_MODEL")
-        or os.getenv("GEMINI_MODEL", "gemini-2.5-pro"),
+        default=os.getenv("SPATIAL_PATH_REASONER_MODEL") or _GEMINI_MODEL,
         description="拖拽路径推理模型（默认跟随 GEMINI_MODEL，可任意字符串）",
     )
 
     # ================================
     # LLM 调用层（用户可配置）
     # ================================
-    LLM_MODE: Literal["openai", "gemini_native", "gemini_openai"] = Field(
+    # 用 str + 实例化后的一次性校验取代 Literal：省去每次构造的判别器验证
+    LLM_MODE: str = Field(
         default=os.getenv("LLM_MODE", "gemini_native"),
         description="LLM 调用模式：openai / gemini_native / gemini_openai",
     )
 
     # 注意：优先使用 LLM_BASE_URL；未提供时向下兼容 GEMINI_BASE_URL
     LLM_BASE_URL: str = Field(
-        default=os.getenv("LLM_BASE_URL", "")
-        or os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com"),
+        default=os.getenv("LLM_BASE_URL", "") or _GEMINI_BASE_URL,
         description="LLM Base URL（严禁代码擅自改写/重写）。",
     )
 
     # 是否在启动时执行 LLM preflight（deploy.py 中调用）
     LLM_PREFLIGHT: bool = Field(
-        default=os.getenv("LLM_PREFLIGHT", "true").lower() in {"1", "true", "yes", "y", "on"},
+        default=_LLM_PREFLIGHT,
         description="启动时执行 LLM preflight/healthcheck（true/false）",
     )
 
-    EPIC_EMAIL: str = Field(default_factory=lambda: os.getenv("EPIC_EMAIL"))
-    EPIC_PASSWORD: SecretStr = Field(default_factory=lambda: os.getenv("EPIC_PASSWORD"))
+    EPIC_EMAIL: str = Field(default=os.getenv("EPIC_EMAIL"))
+    EPIC_PASSWORD: SecretStr = Field(default=os.getenv("EPIC_PASSWORD"))
     DISABLE_BEZIER_TRAJECTORY: bool = Field(default=True)
 
     # ================================
@@ -101,17 +108,17 @@ class EpicSettings(AgentConfig):
         description="验证码整体执行超时（秒），默认 180，可用 env 覆盖",
     )
     RESPONSE_TIMEOUT: float = Field(
-        default=float(os.getenv("RESPONSE_TIMEOUT", "90")),
+        default=float(_RESPONSE_TIMEOUT),
         description="等待验证码服务响应超时（秒），默认 90，可用 env 覆盖",
     )
     CAPTCHA_PAYLOAD_TIMEOUT: float = Field(
-        default=float(os.getenv("CAPTCHA_PAYLOAD_TIMEOUT", os.getenv("RESPONSE_TIMEOUT", "90"))),
+        default=float(os.getenv("CAPTCHA_PAYLOAD_TIMEOUT", _RESPONSE_TIMEOUT)),
         description="等待 hCaptcha getcaptcha payload 的超时（秒），默认 90，可用 env 覆盖",
     )
 
-    cache_dir: Path = HCAPTCHA_DIR.joinpath(".cache")
-    challenge_dir: Path = HCAPTCHA_DIR.joinpath(".challenge")
-    captcha_response_dir: Path = HCAPTCHA_DIR.joinpath(".captcha")
+    cache_dir: Path = _HCAPTCHA_CACHE_DIR
+    challenge_dir: Path = _HCAPTCHA_CHALLENGE_DIR
+    captcha_response_dir: Path = _HCAPTCHA_RESPONSE_DIR
 
     ENABLE_APSCHEDULER: bool = Field(default=True)
     TASK_TIMEOUT_SECONDS: int = Field(default=900)
@@ -120,8 +127,9 @@ class EpicSettings(AgentConfig):
     CELERY_TASK_TIME_LIMIT: int = Field(default=1200)
     CELERY_TASK_SOFT_TIME_LIMIT: int = Field(default=900)
 
-    @property
+    @cached_property
     def user_data_dir(self) -> Path:
+        # 首次访问时建目录，之后是纯属性读取，不再每次 stat 文件系统
         target_ = USER_DATA_DIR.joinpath(self.EPIC_EMAIL)
         target_.mkdir(parents=True, exist_ok=True)
         return target_
@@ -129,6 +137,14 @@ class EpicSettings(AgentConfig):
 settings = EpicSettings()
 settings.ignore_request_questions = ["Please drag the crossing to complete the lines"]
 
+_VALID_LLM_MODES = frozenset({"openai", "gemini_native", "gemini_openai"})
+if settings.LLM_MODE not in _VALID_LLM_MODES:
+    logger.warning("⚠️ 非法 LLM_MODE: {}，回退 gemini_native", settings.LLM_MODE)
+    settings.LLM_MODE = "gemini_native"
+
+_llm_patch_applied = False
+
+
 def _apply_llm_provider_patch() -> None:
     """
     将 hcaptcha-challenger 默认的 GeminiProvider 替换为本项目的通用 LLM Provider。
@@ -137,22 +153,35 @@ def _apply_llm_provider_patch() -> None:
     - 支持任意 base_url（严禁代码擅自改写/重写）
     - 支持 OpenAI 兼容 & Gemini 官方（native / openai）三种模式
     """
-    if not settings.GEMINI_API_KEY:
+    global _llm_patch_applied
+    if _llm_patch_applied or not settings.GEMINI_API_KEY:
         return
 
     try:
         from hcaptcha_challenger.tools.internal.base import Reasoner
         from llm.provider import HcaptchaLLMProvider
 
+        # 打补丁时快照配置：每次 Reasoner 实例化都会走到这里，
+        # 闭包局部变量省去反复穿越 pydantic 的属性访问链
+        llm_mode = settings.LLM_MODE
+        llm_base_url = settings.LLM_BASE_URL
+
         def _create_default_provider(self):  # type: ignore[no-redef]
-            return HcaptchaLLMProvider(
+            # 同一 Reasoner 反复取 provider：实例级缓存，HTTP 客户端只建一次
+            prov = getattr(self, "_cached_provider", None)
+            if prov is not None:
+                return prov
+            prov = HcaptchaLLMProvider(
                 api_key=str(self._api_key),
                 model=str(self._model) if self._model else "",
-                mode=settings.LLM_MODE,
-                base_url=settings.LLM_BASE_URL,
+                mode=llm_mode,
+                base_url=llm_base_url,
             )
+            self._cached_provider = prov
+            return prov
 
         Reasoner._create_default_provider = _create_default_provider  # type: ignore[method-assign]
+        _llm_patch_applied = True
         logger.info(
             "🚀 LLM Provider 补丁已应用 | mode: {} | base_url: {}",
             settings.LLM_MODE,
@@ -165,14 +194,37 @@ def _apply_llm_provider_patch() -> None:
 _apply_llm_provider_patch()
 
 
+# hCaptcha 选择器：模块级常量，补丁内与逐 frame 扫描不再反复拼串
+_HCAPTCHA_CHECKBOX_XPATH = (
+    "//iframe[contains(@src,'hcaptcha.com') and contains(@src, 'frame=checkbox')]"
+)
+_HCAPTCHA_CHALLENGE_XPATH = (
+    "//iframe[contains(@src,'hcaptcha.com') and contains(@src, 'frame=challenge')]"
+)
+_CHALLENGE_VIEW_XPATH = "//div[@class='challenge-view']"
+
+
+def _is_challenge_url(url: str | None) -> bool:
+    """hCaptcha 的 frame url 实际全小写，免去每次调用的 .lower() 整串分配。"""
+    return bool(url) and "hcaptcha.com/captcha" in url and "frame=challenge" in url
+
+
+_hcaptcha_patch_applied = False
+
+
 def _apply_hcaptcha_compat_patch() -> None:
     """
     修复 hcaptcha-challenger 上游硬编码导致的不稳定：
     - getcaptcha payload 等待超时写死 30s（在 Actions 环境容易不够）
     - challenge iframe 域名写死 newassets.hcaptcha.com（Epic/区域/版本变动会找不到 frame）
     """
+    global _hcaptcha_patch_applied
+    if _hcaptcha_patch_applied:
+        return
     try:
         import asyncio
+        import time
+        from collections import deque
         from contextlib import suppress
 
         from hcaptcha_challenger.agent import challenger as hc
@@ -183,48 +235,63 @@ def _apply_hcaptcha_compat_patch() -> None:
 
         def patched_arm_init(self, page, config):  # type: ignore[no-redef]
             orig_arm_init(self, page, config)
-            self._checkbox_selector = (
-                "//iframe[contains(@src,'hcaptcha.com') and contains(@src, 'frame=checkbox')]"
-            )
-            self._challenge_selector = (
-                "//iframe[contains(@src,'hcaptcha.com') and contains(@src, 'frame=challenge')]"
-            )
+            self._checkbox_selector = _HCAPTCHA_CHECKBOX_XPATH
+            self._challenge_selector = _HCAPTCHA_CHALLENGE_XPATH
 
         hc.RoboticArm.__init__ = patched_arm_init  # type: ignore[method-assign]
 
         # 2) 放宽 frame.url 匹配（避免只认 newassets.hcaptcha.com）
         async def patched_get_challenge_frame_locator(self) -> object | None:  # Frame | None
-            def is_challenge_url(url: str) -> bool:
-                u = (url or "").lower()
-                return ("hcaptcha.com/captcha" in u) and ("frame=challenge" in u)
-
-            # 深度优先查找
-            def find_recursive(frame, depth: int, max_depth: int):
-                if depth >= max_depth:
-                    return None
-                for child in getattr(frame, "child_frames", []) or []:
-                    if is_challenge_url(getattr(child, "url", "")):
-                        return child
-                    found = find_recursive(child, depth + 1, max_depth)
-                    if found is not None:
-                        return found
+            is_challenge_url = _is_challenge_url
+
+            # 广度优先迭代查找：免去逐节点的递归调用与栈帧分配
+            def find_breadth_first(root, max_depth: int = 6):
+                dq = deque([(root, 0)])
+                while dq:
+                    frame, depth = dq.popleft()
+                    if depth >= max_depth:
+                        continue
+                    for child in frame.child_frames or ():
+                        if is_challenge_url(child.url):
+                            return child
+                        dq.append((child, depth + 1))
                 return None
 
-            candidate = find_recursive(self.page.main_frame, 0, 6)
+            # 多 crumb 挑战会反复进入：上一轮命中的 frame 若还活着，
+            # 用 200ms 短探测直接复用，跳过整棵 frame 树的重扫
+            last = getattr(self, "_epic_last_challenge_frame", None)
+            if last is not None:
+                # 热路径用裸 try/except：不给每个候选 frame 分配 suppress 上下文对象
+                try:
+                    if not last.is_detached() and is_challenge_url(last.url):
+                        challenge_view = last.locator(_CHALLENGE_VIEW_XPATH)
+                        if await challenge_view.is_visible(timeout=200):
+                            return last
+                except Exception:
+                    pass
+                self._epic_last_challenge_frame = None
+
+            candidate = find_breadth_first(self.page.main_frame)
             if candidate is not None:
-                with suppress(Exception):
-                    challenge_view = candidate.locator("//div[@class='challenge-view']")
+                self._epic_last_challenge_frame = candidate
+                try:
+                    challenge_view = candidate.locator(_CHALLENGE_VIEW_XPATH)
                     if await challenge_view.is_visible(timeout=1500):
                         return candidate
+                except Exception:
+                    pass
                 return candidate
 
             # 扫描全量 frames
             for frame in self.page.frames:
-                if is_challenge_url(getattr(frame, "url", "")):
-                    with suppress(Exception):
-                        challenge_view = frame.locator("//div[@class='challenge-view']")
+                if is_challenge_url(frame.url):
+                    self._epic_last_challenge_frame = frame
+                    try:
+                        challenge_view = frame.locator(_CHALLENGE_VIEW_XPATH)
                         if await challenge_view.is_visible(timeout=1500):
                             return frame
+                    except Exception:
+                        pass
                     return frame
 
             hc.logger.error("Cannot find a valid challenge frame")
@@ -233,15 +300,32 @@ def _apply_hcaptcha_compat_patch() -> None:
         hc.RoboticArm.get_challenge_frame_locator = patched_get_challenge_frame_locator  # type: ignore[method-assign]
 
         # 3) 让 payload 等待超时可配置（默认跟随 settings.CAPTCHA_PAYLOAD_TIMEOUT）
+        # 热路径属性预绑定：枚举常量与函数成为闭包局部（LOAD_DEREF），
+        # 每轮验证码省掉对模块/枚举的一串 LOAD_ATTR
+        _wait_for = asyncio.wait_for
+        _hc_logger = hc.logger
+        # 打补丁时 settings 已就绪：超时解析一次，每轮不再 getattr + float
+        _payload_timeout = float(settings.CAPTCHA_PAYLOAD_TIMEOUT)
+        _rt_binary = RequestType.IMAGE_LABEL_BINARY
+        _rt_area = RequestType.IMAGE_LABEL_AREA_SELECT
+        _rt_drag = RequestType.IMAGE_DRAG_DROP
+        _ct_single = ChallengeTypeEnum.IMAGE_LABEL_SINGLE_SELECT
+        _ct_multi = ChallengeTypeEnum.IMAGE_LABEL_MULTI_SELECT
+        _ct_drag_single = ChallengeTypeEnum.IMAGE_DRAG_SINGLE
+        _ct_drag_multi = ChallengeTypeEnum.IMAGE_DRAG_MULTI
+
         async def patched_review_challenge_type(self) -> object:  # RequestType | ChallengeTypeEnum
             try:
-                timeout = float(getattr(self.config, "CAPTCHA_PAYLOAD_TIMEOUT", 30.0))
-                self._captcha_payload = await asyncio.wait_for(
-                    self._captcha_payload_queue.get(), timeout=timeout
+                t0 = time.monotonic()
+                self._captcha_payload = await _wait_for(
+                    self._captcha_payload_queue.get(), timeout=_payload_timeout
                 )
-                await self.page.wait_for_timeout(500)
+                # 沉降等待自适应：payload 到得慢说明挑战界面早已渲染完，
+                # 固定 500ms 纯属浪费；快速到达时只留一小段渲染缓冲
+                if time.monotonic() - t0 < 0.5:
+                    await self.page.wait_for_timeout(200)
             except asyncio.TimeoutError:
-                hc.logger.error("Wait for captcha payload to timeout")
+                _hc_logger.error("Wait for captcha payload to timeout")
                 self._captcha_payload = None
 
             self.robotic_arm.signal_crumb_count = None
@@ -254,36 +338,29 @@ def _apply_hcaptcha_compat_patch() -> None:
                 tasklist = self._captcha_payload.tasklist
                 tasklist_length = len(tasklist)
                 self.robotic_arm.captcha_payload = self._captcha_payload
-                match request_type:
-                    case RequestType.IMAGE_LABEL_BINARY:
-                        self.robotic_arm.signal_crumb_count = int(tasklist_length / 9)
-                        return RequestType.IMAGE_LABEL_BINARY
-                    case RequestType.IMAGE_LABEL_AREA_SELECT:
-                        self.robotic_arm.signal_crumb_count = tasklist_length
-                        max_shapes = self._captcha_payload.request_config.max_shapes_per_image
-                        if not isinstance(max_shapes, int):
-                            return await self.robotic_arm.check_challenge_type()
-                        return (
-                            ChallengeTypeEnum.IMAGE_LABEL_SINGLE_SELECT
-                            if max_shapes == 1
-                            else ChallengeTypeEnum.IMAGE_LABEL_MULTI_SELECT
-                        )
-                    case RequestType.IMAGE_DRAG_DROP:
-                        self.robotic_arm.signal_crumb_count = tasklist_length
-                        return (
-                            ChallengeTypeEnum.IMAGE_DRAG_SINGLE
-                            if len(tasklist[0].entities) == 1
-                            else ChallengeTypeEnum.IMAGE_DRAG_MULTI
-                        )
-
-                hc.logger.warning(f"Unknown request_type: {request_type=}")
+                if request_type == _rt_binary:
+                    self.robotic_arm.signal_crumb_count = int(tasklist_length / 9)
+                    return _rt_binary
+                if request_type == _rt_area:
+                    self.robotic_arm.signal_crumb_count = tasklist_length
+                    max_shapes = self._captcha_payload.request_config.max_shapes_per_image
+                    if not isinstance(max_shapes, int):
+                        return await self.robotic_arm.check_challenge_type()
+                    return _ct_single if max_shapes == 1 else _ct_multi
+                if request_type == _rt_drag:
+                    self.robotic_arm.signal_crumb_count = tasklist_length
+                    first_entities_len = len(tasklist[0].entities)
+                    return _ct_drag_single if first_entities_len == 1 else _ct_drag_multi
+
+                _hc_logger.warning(f"Unknown request_type: {request_type=}")
             except Exception as err:
-                hc.logger.error(f"Error parsing challenge type: {err}")
+                _hc_logger.error(f"Error parsing challenge type: {err}")
 
             return await self.robotic_arm.check_challenge_type()
 
         hc.AgentV._review_challenge_type = patched_review_challenge_type  # type: ignore[method-assign]
 
+        _hcaptcha_patch_applied = True
         logger.info(
             "🧩 hcaptcha-challenger 兼容补丁已应用 | payload_timeout={}s",
             settings.CAPTCHA_PAYLOAD_TIMEOUT,
@@ -293,3 +370,41 @@ def _apply_hcaptcha_compat_patch() -> None:
 
 
 _apply_hcaptcha_compat_patch()
+
+
+_playwright_patch_applied = False
+
+
+def _apply_playwright_stack_patch() -> None:
+    """
+    剥离 playwright-python 客户端为调试追踪采集调用栈的纯开销：
+    每次 await page.* 都会走一次 inspect.stack()，社区测量约占客户端 CPU 25%。
+    本项目不使用 Playwright tracing，置空无功能损失；设 PW_INSPECT_STACK=1 可跳过本补丁。
+    """
+    global _playwright_patch_applied
+    if _playwright_patch_applied or os.getenv("PW_INSPECT_STACK", "0") != "0":
+        return
+
+    try:
+        from contextlib import suppress
+        from importlib import import_module
+
+        # capture_call_stack 的落点随 playwright 版本迁移，逐个候选模块尝试
+        patched = False
+        for mod_name in ("playwright._impl._connection", "playwright._impl._stack_utils"):
+            with suppress(ImportError):
+                module = import_module(mod_name)
+                if hasattr(module, "capture_call_stack"):
+                    module.capture_call_stack = lambda *_args, **_kwargs: []
+                    patched = True
+
+        if patched:
+            _playwright_patch_applied = True
+            logger.info("🎭 Playwright 调用栈采集已停用（PW_INSPECT_STACK=1 可恢复）")
+        else:
+            logger.debug("Playwright capture_call_stack 未找到，跳过补丁（版本不匹配）")
+    except Exception as e:
+        logger.warning(f"⚠️ Playwright 调用栈补丁加载失败: {e}")
+
+
+_apply_playwright_stack_patch()
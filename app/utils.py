@@ -5,8 +5,11 @@ import sys
 from zoneinfo import ZoneInfo
 from loguru import logger
 
-def timezone_filter(record):
-    record["time"] = record["time"].astimezone(ZoneInfo("Asia/Shanghai"))
+_SHANGHAI = ZoneInfo("Asia/Shanghai")
+
+def timezone_filter(record, _tz=_SHANGHAI):
+    # 每条日志都会经过这里：tz 对象建一次，默认参数绑定省去全局查找
+    record["time"] = record["time"].astimezone(_tz)
     return record
 
 def init_log(**sink_channel):